@@ -0,0 +1,427 @@
+# =========================
+# Benchmark offline del censo (sin Discord real)
+# =========================
+# Corre el flujo del censo de main.py contra un guild falso en memoria: roles,
+# miembros y canales locales, con latencia REST simulada y 429 aleatorios.
+# Cada escenario corre en un proceso propio (estado global limpio, pico de
+# memoria propio) y el resultado sale como JSON para comparar corridas.
+#
+#   python bench_censo.py                              # 1k / 10k / 50k
+#   python bench_censo.py --members 1000 --latency-ms 50 --rate-limit 0.02
+#   python bench_censo.py --out bench.json
+import os
+import sys
+import json
+import time
+import types
+import random
+import asyncio
+import argparse
+import resource
+import tempfile
+import contextlib
+import subprocess
+from collections import Counter
+from datetime import datetime, timezone
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SCENARIOS = ("census", "answers", "tick")
+
+# =========================
+# Discord falso
+# =========================
+class FakeResponse:
+    def __init__(self, status: int, headers: dict | None = None):
+        self.status = status
+        self.reason = "simulated"
+        self.headers = headers or {}
+
+
+class FakeREST:
+    # Toda llamada "saliente" pasa por aquí: cuenta, duerme la latencia y a veces
+    # responde 429. Como discord.py, el 429 se reintenta solo tras Retry-After y el
+    # trace HTTP del bot lo ve (main frena el bucket de DMs).
+    def __init__(self, main, latency: float, jitter: float, rate_limit: float, retry_after: float):
+        self.main = main
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.calls = Counter()
+        self.rate_limited = Counter()
+
+    async def call(self, route: str):
+        while True:
+            self.calls[route] += 1
+            await asyncio.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+            if random.random() >= self.rate_limit:
+                return
+            self.rate_limited[route] += 1
+            response = FakeResponse(429, {"Retry-After": str(self.retry_after)})
+            await self.main._on_http_request_end(None, None, types.SimpleNamespace(response=response))
+            await asyncio.sleep(self.retry_after)
+
+
+class FakeMember:
+    def __init__(self, rest: FakeREST, member_id: int, dm_closed: bool):
+        self.rest = rest
+        self.id = member_id
+        self.roles = []
+        self.dm_closed = dm_closed
+        self.mention = f"<@{member_id}>"
+
+        self.dm_channel = None
+
+    def __str__(self):
+        return f"member-{self.id}"
+
+    async def create_dm(self):
+        await self.rest.call("create_dm")
+        self.dm_channel = FakeDMChannel(self)
+        return self.dm_channel
+
+    async def send(self, content=None, view=None, **kwargs):
+        channel = self.dm_channel or await self.create_dm()
+        await channel.send(content=content, view=view)
+
+    async def add_roles(self, *roles, reason=None):
+        await self.rest.call("add_roles")
+        self.roles.extend(r for r in roles if r not in self.roles)
+
+    async def remove_roles(self, *roles, reason=None):
+        await self.rest.call("remove_roles")
+        self.roles = [r for r in self.roles if r not in roles]
+
+
+class FakeDMChannel:
+    OFFSET = 10**9  # id del canal DM = id del miembro + OFFSET
+
+    def __init__(self, member: FakeMember):
+        self.member = member
+        self.id = member.id + self.OFFSET
+
+    async def send(self, content=None, view=None, **kwargs):
+        await self.member.rest.call("dm")
+        if self.member.dm_closed:
+            raise self.member.rest.main.discord.Forbidden(FakeResponse(403), "Cannot send messages to this user")
+
+
+class FakeRole:
+    def __init__(self, role_id: int, members=()):
+        self.id = role_id
+        self.name = f"role-{role_id}"
+        self.mention = f"<@&{role_id}>"
+        self.members = list(members)
+
+
+class FakeMessage:
+    def __init__(self, channel, message_id: int):
+        self.channel = channel
+        self.id = message_id
+
+    async def edit(self, **kwargs):
+        await self.channel.rest.call("panel_edit")
+
+
+class FakeChannel:
+    def __init__(self, rest: FakeREST, channel_id: int):
+        self.rest = rest
+        self.id = channel_id
+        self.mention = f"<#{channel_id}>"
+
+    async def send(self, content=None, **kwargs):
+        await self.rest.call("log")
+
+    def get_partial_message(self, message_id: int):
+        return FakeMessage(self, message_id)
+
+
+class FakeGuild:
+    ROLE_TARGET, ROLE_NO, ROLE_PENDING, LOG_CHANNEL = 10, 11, 12, 20
+
+    def __init__(self, rest: FakeREST, guild_id: int, members: int, dm_closed: float):
+        self.rest = rest
+        self.id = guild_id
+        self.name = f"guild-{guild_id}"
+        self.members = {
+            i: FakeMember(rest, i, random.random() < dm_closed)
+            for i in range(1, members + 1)
+        }
+        self.roles = {
+            self.ROLE_TARGET: FakeRole(self.ROLE_TARGET, self.members.values()),
+            self.ROLE_NO: FakeRole(self.ROLE_NO),
+            self.ROLE_PENDING: FakeRole(self.ROLE_PENDING),
+        }
+        for m in self.members.values():
+            m.roles.append(self.roles[self.ROLE_TARGET])
+        self.channels = {self.LOG_CHANNEL: FakeChannel(rest, self.LOG_CHANNEL)}
+
+    def get_member(self, member_id: int):
+        return self.members.get(member_id)
+
+    chunked = True  # el roster completo ya está en memoria
+
+    async def fetch_member(self, member_id: int):
+        await self.rest.call("fetch_member")
+        raise self.rest.main.discord.NotFound(FakeResponse(404), "Unknown Member")
+
+    async def query_members(self, user_ids=None, limit: int = 5, cache: bool = True):
+        return [self.members[uid] for uid in user_ids or () if uid in self.members]
+
+    def get_role(self, role_id: int):
+        return self.roles.get(role_id)
+
+    def get_channel(self, channel_id: int):
+        return self.channels.get(channel_id)
+
+
+class FakeBot:
+    def __init__(self, guild: FakeGuild):
+        self.guild = guild
+        self.user = types.SimpleNamespace(id=1)
+
+    def get_guild(self, guild_id: int):
+        return self.guild if guild_id == self.guild.id else None
+
+    def get_channel(self, channel_id: int):
+        return self.guild.get_channel(channel_id)
+
+    def get_partial_messageable(self, channel_id: int, type=None):
+        member = self.guild.members.get(channel_id - FakeDMChannel.OFFSET)
+        if member is None:
+            raise ValueError(f"canal DM desconocido: {channel_id}")
+        return FakeDMChannel(member)
+
+    async def wait_until_ready(self):
+        return
+
+
+class FakeInteractionResponse:
+    def __init__(self):
+        self._done = False
+
+    def is_done(self) -> bool:
+        return self._done
+
+    async def send_message(self, content=None, **kwargs):
+        self._done = True
+
+    async def defer(self, **kwargs):
+        self._done = True
+
+
+class FakeInteraction:
+    def __init__(self, user_id: int):
+        self.user = types.SimpleNamespace(id=user_id)
+        self.response = FakeInteractionResponse()
+        self.guild_id = None
+        self.created_at = datetime.now(timezone.utc)  # el clic: el ack se mide desde aquí
+
+# =========================
+# Medición
+# =========================
+class PersistenceTimer:
+    # Envuelve backend.write del store: tiempo total, escrituras y tamaño final.
+    def __init__(self, store):
+        self.seconds = 0.0
+        self.writes = 0
+        write = store.backend.write
+
+        def timed_write(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return write(*args, **kwargs)
+            finally:
+                self.seconds += time.perf_counter() - started
+                self.writes += 1
+
+        store.backend.write = timed_write
+
+
+async def _drain(main, kinds: tuple, timeout: float):
+    # espera a que la cola no tenga trabajos vivos de esos tipos
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if not any(j["kind"] in kinds and j["state"] in ("queued", "running") for j in main.jobs.jobs.values()):
+            return True
+        await asyncio.sleep(0.02)
+    return False
+
+
+def _time_embed(main, guild_id: int, repeat: int = 20) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        main.build_status_embed(guild_id)
+    return (time.perf_counter() - started) / repeat
+
+
+async def run_scenario(args) -> dict:
+    # main lee la config del entorno al importarse: primero el entorno, luego el import
+    workdir = tempfile.mkdtemp(prefix="censo-bench-")
+    os.chdir(workdir)
+    os.environ.update({
+        "CENSO_STORAGE": args.storage,
+        "CENSO_SAVE_DELAY": str(args.save_delay),
+        "CENSO_DM_RATE": str(args.dm_rate),
+        "CENSO_DM_BURST": str(max(1, int(args.dm_rate))),
+        "CENSO_DM_CONCURRENCY": str(args.dm_concurrency),
+        "CENSO_ROLE_RATE": str(args.role_rate),
+        "CENSO_ROLE_WORKERS": str(args.role_workers),
+        "CENSO_OUTBOUND_RATE": str(args.outbound_rate),
+        "CENSO_LOG_DIGEST_SECONDS": "0.5",
+        "CENSO_ACK_SAMPLES": str(max(1000, args.members)),
+    })
+    sys.path.insert(0, REPO_DIR)
+    with contextlib.redirect_stdout(sys.stderr):
+        import main
+
+    random.seed(args.seed)
+    rest = FakeREST(main, args.latency_ms / 1000, args.jitter_ms / 1000, args.rate_limit, args.retry_after)
+    guild = FakeGuild(rest, 1000, args.members, args.dm_closed)
+    bot = FakeBot(guild)
+    result = {"scenario": args.run, "members": args.members, "storage": args.storage}
+
+    quiet = contextlib.redirect_stdout(sys.stderr)  # main imprime cada cambio de rol
+    with quiet:
+        main.store.start()
+        timer = PersistenceTimer(main.store)
+        main.rebuild_status_indexes()
+        main.jobs.start(bot)
+        g = main.ensure_guild(main.load_data(), guild.id)
+        g.update(
+            role_id=FakeGuild.ROLE_TARGET,
+            role_no_id=FakeGuild.ROLE_NO,
+            role_pending_id=FakeGuild.ROLE_PENDING,
+            log_channel_id=FakeGuild.LOG_CHANNEL,
+        )
+
+        started = time.perf_counter()
+        ok, msg = await main.start_censo(bot, guild)
+        result["start_censo_s"] = time.perf_counter() - started
+        if not ok:
+            raise RuntimeError(msg)
+        drained = await _drain(main, ("dm", "role_pending"), args.timeout)
+        result["census_wall_s"] = time.perf_counter() - started
+        result["census_drained"] = drained
+
+        if args.run == "answers":
+            # ráfaga: una fracción responde a la vez, mitad sí / mitad no
+            responders = random.sample(list(guild.members), int(args.members * args.answer_ratio))
+            main.ACK_LATENCY.samples.clear()
+            started = time.perf_counter()
+            await asyncio.gather(*(
+                main.apply_censo_answer(bot, FakeInteraction(uid), guild.id, g["censo_id"], uid, "YES" if uid % 2 else "NO")
+                for uid in responders
+            ))
+            result["answers"] = len(responders)
+            result["answer_burst_s"] = time.perf_counter() - started
+            result["ack_p50_ms"] = (main.ACK_LATENCY.percentile(50) or 0) * 1000
+            result["ack_p99_ms"] = (main.ACK_LATENCY.percentile(99) or 0) * 1000
+            result["answer_roles_drained"] = await _drain(main, ("answer_roles",), args.timeout)
+            result["answer_roles_wall_s"] = time.perf_counter() - started
+
+        if args.run == "tick":
+            # todos los pendientes vencen a la vez: un solo tick del scheduler
+            sent_long_ago = (main.now_utc() - main.timedelta(hours=main.REMINDER_HOURS + 1)).isoformat()
+            for uid in main.status_index(guild.id, g).members("PENDING"):
+                main.set_user_status(guild.id, g, uid, "PENDING", last_sent_utc=sent_long_ago)
+            for m in guild.members.values():
+                m.dm_channel = None  # como tras un reinicio: solo queda el id guardado
+            main.reminders.bot = bot
+            started = time.perf_counter()
+            due = main.reminders._pop_due()
+            for gid, uids in due.items():
+                await main.reminders._fire(gid, uids)
+            result["tick_s"] = time.perf_counter() - started
+            result["tick_due"] = sum(len(uids) for uids in due.values())
+            result["reminders_drained"] = await _drain(main, ("dm",), args.timeout)
+            result["reminders_wall_s"] = time.perf_counter() - started
+
+        result["embed_ms"] = _time_embed(main, guild.id) * 1000
+
+        main.flush_log_digests()
+        await _drain(main, ("log",), args.timeout)
+        await main.jobs.close()
+        await main.store.close()
+
+    data_path = main.DB_FILE if args.storage == "sqlite" else main.DATA_FILE
+    result.update({
+        "persist_s": timer.seconds,
+        "persist_writes": timer.writes,
+        "data_bytes": os.path.getsize(data_path) if os.path.exists(data_path) else 0,
+        "jobs_bytes": os.path.getsize(main.JOBS_FILE) if os.path.exists(main.JOBS_FILE) else 0,
+        "rest_calls": dict(rest.calls),
+        "rest_calls_total": sum(rest.calls.values()),
+        "rate_limited": dict(rest.rate_limited),
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    })
+    return result
+
+# =========================
+# CLI
+# =========================
+def _parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="Benchmark offline del censo OGT")
+    p.add_argument("--members", default="1000,10000,50000", help="tamaños del rol objetivo, separados por coma")
+    p.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"escenarios ({', '.join(SCENARIOS)})")
+    p.add_argument("--storage", default="json", choices=("json", "sqlite"))
+    p.add_argument("--latency-ms", type=float, default=5.0, help="latencia REST simulada")
+    p.add_argument("--jitter-ms", type=float, default=2.0)
+    p.add_argument("--rate-limit", type=float, default=0.0, help="probabilidad de 429 por llamada")
+    p.add_argument("--retry-after", type=float, default=0.5, help="Retry-After de los 429 simulados (s)")
+    p.add_argument("--dm-closed", type=float, default=0.1, help="fracción de miembros con DMs cerrados")
+    p.add_argument("--answer-ratio", type=float, default=0.5, help="fracción que responde en la ráfaga")
+    p.add_argument("--dm-rate", type=float, default=10000.0)
+    p.add_argument("--dm-concurrency", type=int, default=32)
+    p.add_argument("--role-rate", type=float, default=10000.0)
+    p.add_argument("--role-workers", type=int, default=8)
+    p.add_argument("--outbound-rate", type=float, default=10000.0, help="tope global de llamadas REST/s (CENSO_OUTBOUND_RATE)")
+    p.add_argument("--save-delay", type=float, default=0.5)
+    p.add_argument("--timeout", type=float, default=1800.0, help="máximo por fase (s)")
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--out", help="archivo JSON de salida (por defecto stdout)")
+    p.add_argument("--run", help=argparse.SUPPRESS)  # proceso hijo: un solo escenario
+    return p
+
+
+def main_cli(argv: list[str] | None = None):
+    args = _parser().parse_args(argv)
+
+    if args.run:
+        args.members = int(args.members)
+        print(json.dumps(asyncio.run(run_scenario(args))))
+        return
+
+    child_args = [a for a in (argv if argv is not None else sys.argv[1:])]
+    results = []
+    for members in [int(n) for n in args.members.split(",") if n.strip()]:
+        for scenario in [s.strip() for s in args.scenarios.split(",") if s.strip()]:
+            if scenario not in SCENARIOS:
+                raise SystemExit(f"escenario desconocido: {scenario}")
+            print(f"▶ {scenario} · {members} miembros", file=sys.stderr)
+            proc = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), *child_args, "--members", str(members), "--run", scenario],
+                stdout=subprocess.PIPE, text=True,
+            )
+            if proc.returncode != 0:
+                results.append({"scenario": scenario, "members": members, "error": f"exit {proc.returncode}"})
+                continue
+            results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+    report = {
+        "generated_utc": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": sys.version.split()[0],
+        "config": {k: v for k, v in vars(args).items() if k not in ("run", "out")},
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main_cli()
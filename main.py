@@ -1,10 +1,31 @@
 import os
+import sys
 import json
 import random
 import discord
 import asyncio  # NUEVO
+import contextlib
+import csv
+import gzip
+import heapq
+import collections
+import itertools
+import atexit
+import signal
+import shutil
+import sqlite3
+import threading
+import concurrent.futures
+import time
+import tempfile
+import aiohttp
+from aiohttp import web
+try:  # NUEVO: codec JSON más rápido si está instalado (opcional)
+    import orjson
+except ImportError:
+    orjson = None
 from discord import app_commands
-from discord.ext import commands, tasks
+from discord.ext import commands
 from datetime import datetime, timedelta, UTC  # FIX
 
 DATA_FILE = "censo_data.json"  # FIX Railway + Volume
@@ -12,32 +33,964 @@ from dotenv import load_dotenv  # NUEVO
 load_dotenv()  # NUEVO
 GUILD_ID_TEST = int(os.getenv("GUILD_ID_TEST", "0"))  # FIX Railway
 
+# =========================
+# Métricas (texto Prometheus, opcional)
+# =========================
+# NUEVO: con CENSO_METRICS_PORT > 0 se sirve /metrics por HTTP. Sin dependencias
+# extra: contadores, gauges e histogramas en memoria, con etiquetas.
+METRICS_PORT = int(os.getenv("CENSO_METRICS_PORT", "0"))  # 0 = desactivado
+METRICS_HOST = os.getenv("CENSO_METRICS_HOST", "0.0.0.0")
+METRIC_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Metrics:  # NUEVO
+    def __init__(self):
+        self.kinds: dict[str, tuple[str, str]] = {}  # nombre -> (tipo, ayuda)
+        self.values: dict[tuple, float] = {}         # (nombre, etiquetas) -> valor
+        self.histograms: dict[tuple, list] = {}      # (nombre, etiquetas) -> [buckets, suma, n]
+        self._runner = None
+
+    def describe(self, name: str, kind: str, help_text: str):
+        self.kinds[name] = (kind, help_text)
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        self.values[key] = self.values.get(key, 0.0) + value
+
+    def set(self, name: str, value: float, **labels):
+        self.values[(name, tuple(sorted((k, str(v)) for k, v in labels.items())))] = value
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        h = self.histograms.get(key)
+        if h is None:
+            h = self.histograms[key] = [[0] * len(METRIC_BUCKETS), 0.0, 0]
+        for i, bound in enumerate(METRIC_BUCKETS):
+            if value <= bound:
+                h[0][i] += 1
+        h[1] += value
+        h[2] += 1
+
+    @contextlib.contextmanager
+    def timer(self, name: str, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    @staticmethod
+    def _labels(labels: tuple, extra: str = "") -> str:
+        parts = [f'{k}="{v}"' for k, v in labels]
+        if extra:
+            parts.append(extra)
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    def render(self) -> str:
+        lines = []
+        for name, (kind, help_text) in sorted(self.kinds.items()):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == "histogram":
+                for (n, labels), (buckets, total, count) in self.histograms.items():
+                    if n != name:
+                        continue
+                    for bound, c in zip(METRIC_BUCKETS, buckets):
+                        le = f'le="{bound}"'
+                        lines.append(f"{name}_bucket{self._labels(labels, le)} {c}")
+                    le = 'le="+Inf"'
+                    lines.append(f"{name}_bucket{self._labels(labels, le)} {count}")
+                    lines.append(f"{name}_sum{self._labels(labels)} {total}")
+                    lines.append(f"{name}_count{self._labels(labels)} {count}")
+            else:
+                for (n, labels), value in self.values.items():
+                    if n == name:
+                        lines.append(f"{name}{self._labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    async def _handle(self, request):
+        return web.Response(text=self.render(), content_type="text/plain", charset="utf-8")
+
+    async def start(self, port: int = METRICS_PORT, host: str = METRICS_HOST):
+        if port <= 0 or self._runner is not None:
+            return
+        app = web.Application()
+        app.router.add_get("/metrics", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        print(f"📈 Métricas en http://{host}:{port}/metrics")
+
+    async def close(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+metrics = Metrics()  # NUEVO
+metrics.describe("censo_dm_total", "counter", "DMs del censo por guild y resultado (sent, failed = DM cerrado, error).")
+metrics.describe("censo_answer_ack_seconds", "histogram", "Tiempo desde el clic en el DM (created_at de la interacción) hasta el ack.")
+metrics.describe("censo_answer_handler_seconds", "histogram", "Tiempo dentro del handler de la respuesta hasta el ack (sin gateway ni cola).")
+metrics.describe("censo_save_seconds", "histogram", "Duración de cada escritura del estado al almacenamiento.")
+metrics.describe("censo_load_seconds", "histogram", "Duración de la carga del estado desde el almacenamiento.")
+metrics.describe("censo_data_bytes", "gauge", "Tamaño del archivo de datos tras la última escritura.")
+metrics.describe("censo_scheduler_tick_seconds", "histogram", "Duración de cada tick del scheduler de recordatorios.")
+metrics.describe("censo_panel_edits_total", "counter", "Ediciones del panel por guild.")
+metrics.describe("censo_http_429_total", "counter", "Respuestas 429 observadas por scope de Discord.")
+metrics.describe("censo_http_retry_after_seconds_total", "counter", "Suma de Retry-After de los 429 observados.")
+metrics.describe("censo_lane_depth", "gauge", "Trabajos en cola por carril de la cola de acciones.")
+metrics.describe("censo_outbound_waiting", "gauge", "Acciones esperando el presupuesto global, por prioridad.")
+metrics.describe("censo_loop_lag_seconds", "gauge", "Retraso del event loop en la última medición (si sube, algo lo bloquea).")
+
+LOOP_LAG_INTERVAL = float(os.getenv("CENSO_LOOP_LAG_INTERVAL", "0.5"))
+
+async def watch_loop_lag():
+    # NUEVO: cuánto tarde despierta el loop respecto a lo pedido
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(LOOP_LAG_INTERVAL)
+        metrics.set("censo_loop_lag_seconds", max(0.0, time.perf_counter() - started - LOOP_LAG_INTERVAL))
+        # NUEVO: profundidad de carriles y espera por prioridad (mismo muestreo)
+        for lane, depth in jobs.lane_depths().items():
+            metrics.set("censo_lane_depth", depth, lane=lane)
+        waiting = outbound_bucket.waiting()
+        for priority in (PRIORITY_ANSWER, PRIORITY_UPDATE, PRIORITY_BULK):
+            metrics.set("censo_outbound_waiting", waiting.get(priority, 0), priority=priority)
+
 # =========================
 # Persistencia simple JSON
 # =========================
 def now_utc():  # FIX
     return datetime.now(UTC)
 
-def load_data() -> dict:
-    if not os.path.exists(DATA_FILE):
-        return {"guilds": {}}
-    try:
-        with open(DATA_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
-        return {"guilds": {}}
+# NUEVO: tiempo máximo (segundos) que un cambio puede esperar en memoria antes de ir a disco
+SAVE_DELAY = float(os.getenv("CENSO_SAVE_DELAY", "2.0"))
+# NUEVO: backend de persistencia: "json" (archivo único) o "sqlite" (filas por usuario)
+STORAGE_BACKEND = os.getenv("CENSO_STORAGE", "json").strip().lower()
+DB_FILE = os.getenv("CENSO_DB_FILE", "censo_data.db")
+
+USER_FIELDS = ("status", "attempts", "last_sent_utc", "response_utc")
 
-def save_data(data: dict):
-    # NUEVO: asegurar carpeta si DATA_FILE tiene ruta tipo /app/data/...
+def _ensure_folder(path: str):
+    # NUEVO: asegurar carpeta si la ruta es tipo /app/data/...
     try:  # NUEVO
-        folder = os.path.dirname(DATA_FILE)  # NUEVO
+        folder = os.path.dirname(path)  # NUEVO
         if folder:  # NUEVO
             os.makedirs(folder, exist_ok=True)  # NUEVO
     except Exception:  # NUEVO
         pass  # NUEVO
 
-    with open(DATA_FILE, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+# NUEVO: JSON compacto (sin indent); con orjson si está disponible
+def _encode_json(data: dict) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def _decode_json(raw: bytes) -> dict:
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+# NUEVO: escritura atómica (tmp + fsync + rename) y anillo de backups con fecha.
+# Un crash a mitad de escritura deja el archivo anterior intacto; si aun así el
+# archivo no se puede leer, se recupera del backup válido más reciente.
+BACKUP_COUNT = int(os.getenv("CENSO_BACKUPS", "5"))                       # 0 = sin backups
+BACKUP_INTERVAL = float(os.getenv("CENSO_BACKUP_INTERVAL", "600"))        # segundos entre backups
+FSYNC_INTERVAL = float(os.getenv("CENSO_FSYNC_INTERVAL", "0"))            # 0 = fsync en cada escritura
+
+def _backup_files(path: str) -> list[str]:
+    # más reciente primero (el sufijo es un timestamp ordenable)
+    folder = os.path.dirname(path) or "."
+    prefix = os.path.basename(path) + ".bak-"
+    try:
+        names = [n for n in os.listdir(folder) if n.startswith(prefix)]
+    except OSError:
+        return []
+    return [os.path.join(os.path.dirname(path), n) for n in sorted(names, reverse=True)]
+
+def _fsync_dir(path: str):
+    with contextlib.suppress(OSError):
+        fd = os.open(os.path.dirname(path) or ".", os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+def _load_json_file(path: str) -> dict:
+    with open(path, "rb") as f:
+        data = _decode_json(f.read())
+    if not isinstance(data, dict):
+        raise ValueError("el documento no es un objeto JSON")
+    return data
+
+def _read_data_file(path: str = DATA_FILE) -> dict:
+    if not os.path.exists(path):
+        if not _backup_files(path):
+            return {"guilds": {}}
+        error = FileNotFoundError(path)
+    else:
+        try:
+            return _load_json_file(path)
+        except Exception as e:
+            error = e
+
+    # FIX: antes se devolvía {"guilds": {}} y el siguiente guardado borraba todo
+    print(f"⚠️ No pude leer {path}: {error!r}. Buscando backup válido...")
+    if os.path.exists(path):
+        corrupt = f"{path}.corrupt-{now_utc().strftime('%Y%m%dT%H%M%S')}"
+        with contextlib.suppress(OSError):
+            os.replace(path, corrupt)
+            print(f"⚠️ Archivo dañado apartado como {corrupt}")
+    for backup in _backup_files(path):
+        try:
+            data = _load_json_file(backup)
+        except Exception:
+            continue
+        print(f"✅ Estado recuperado de {backup}")
+        return data
+    print("❌ Ningún backup válido: se inicia vacío (el archivo dañado se conserva).")
+    return {"guilds": {}}
+
+class AtomicJsonWriter:  # NUEVO
+    def __init__(self, path: str = DATA_FILE):
+        self.path = path
+        self.last_fsync = 0.0
+        self.last_backup = 0.0
+
+    def _rotate_backups(self):
+        if BACKUP_COUNT <= 0 or not os.path.exists(self.path):
+            return
+        now = time.monotonic()
+        if self.last_backup and now - self.last_backup < BACKUP_INTERVAL:
+            return
+        backup = f"{self.path}.bak-{now_utc().strftime('%Y%m%dT%H%M%S%f')}"
+        try:
+            os.link(self.path, backup)  # el archivo actual (ya completo) pasa a ser el backup
+        except OSError:
+            shutil.copy2(self.path, backup)
+        self.last_backup = now
+        for old in _backup_files(self.path)[BACKUP_COUNT:]:
+            with contextlib.suppress(OSError):
+                os.remove(old)
+
+    def write(self, data: dict):
+        _ensure_folder(self.path)
+        raw = _encode_json(data)
+        now = time.monotonic()
+        sync = FSYNC_INTERVAL <= 0 or now - self.last_fsync >= FSYNC_INTERVAL
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(raw)
+            f.flush()
+            if sync:
+                os.fsync(f.fileno())
+        self._rotate_backups()
+        os.replace(tmp, self.path)
+        if sync:
+            _fsync_dir(self.path)
+            self.last_fsync = now
+
+def _write_data_file(data: dict, writer: AtomicJsonWriter | None = None):
+    (writer or AtomicJsonWriter()).write(data)
+
+def _snapshot(obj):
+    # copia de los contenedores (dict/list); los valores son inmutables (str/int/None)
+    if isinstance(obj, dict):
+        return {k: _snapshot(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_snapshot(v) for v in obj]
+    return obj
+
+# NUEVO: journal append-only (una línea compacta por cambio de estado de un usuario
+# o de config) aplicado sobre el último snapshot al arrancar. Cada línea lleva un
+# número de secuencia; el snapshot guarda el último incluido ("journal_seq").
+JOURNAL_FILE = os.getenv("CENSO_JOURNAL_FILE", "censo_journal.jsonl")
+JOURNAL_MAX_BYTES = int(os.getenv("CENSO_JOURNAL_MAX_BYTES", str(4 * 1024 * 1024)))  # compactar al pasar
+JOURNAL_ARCHIVES = int(os.getenv("CENSO_JOURNAL_ARCHIVES", "20"))  # segmentos compactados a conservar (auditoría)
+
+def _config_of(g: dict) -> dict:
+    return {k: v for k, v in g.items() if k not in ("users", "history")}
+
+def _apply_journal(data: dict, rec: dict):
+    g = data.setdefault("guilds", {}).setdefault(rec["g"], {})
+    if rec["op"] == "config":
+        g.update(rec["v"])
+        for k in rec.get("x", ()):
+            g.pop(k, None)
+    elif rec["op"] == "user" and g.get("censo_id") == rec["c"]:
+        g.setdefault("users", {})[rec["u"]] = rec["v"]
+
+def _journal_segments(journal_path: str) -> list[str]:
+    # segmentos ya compactados, del más viejo al más nuevo (sufijo = timestamp ordenable)
+    folder = os.path.dirname(journal_path) or "."
+    prefix = os.path.basename(journal_path) + "."
+    try:
+        names = sorted(n for n in os.listdir(folder) if n.startswith(prefix))
+    except OSError:
+        return []
+    return [os.path.join(os.path.dirname(journal_path), n) for n in names]
+
+def _last_journal_seq(path: str) -> int:
+    # solo lee la cola del archivo: alcanza con la última línea válida
+    try:
+        with open(path, "rb") as f:
+            f.seek(max(0, os.path.getsize(path) - 65536))
+            lines = f.read().splitlines()
+    except OSError:
+        return 0
+    for line in reversed(lines):
+        try:
+            return int(_decode_json(line).get("s", 0))
+        except Exception:
+            continue
+    return 0
+
+class JsonBackend:  # NUEVO
+    # Snapshot completo + journal: responder agrega una línea (O(1)); un censo
+    # nuevo o un journal que pasa JOURNAL_MAX_BYTES reescriben el snapshot.
+    queries_disk = False
+    journaled = True  # el store le pasa cada cambio de usuario en orden
+
+    def __init__(self, path: str = DATA_FILE, journal_path: str | None = JOURNAL_FILE):
+        self.path = path
+        self.writer = AtomicJsonWriter(self.path)  # NUEVO
+        self.journal_path = journal_path
+        self.archive = FileArchive()  # NUEVO: historial fuera del snapshot
+        self.journal_bytes = 0
+        self.seq = 0
+        self.last_fsync = 0.0
+        self._fh = None
+        self._configs: dict[str, dict] = {}  # última config escrita por guild (el journal guarda solo la diferencia)
+
+    def load(self) -> dict:
+        data = self._load()
+        self._configs = {gid: _snapshot(_config_of(g)) for gid, g in data.get("guilds", {}).items()}
+        return data
+
+    def _load(self) -> dict:
+        data = _read_data_file(self.path)
+        self.seq = int(data.pop("journal_seq", 0))
+        if not self.journal_path:
+            return data
+        # FIX: un snapshot recuperado de backup puede ser anterior a la última compactación;
+        # los segmentos archivados después de él cubren el hueco (del más nuevo hacia atrás
+        # hasta el que ya está incluido; en un arranque normal no se lee ninguno)
+        segments = []
+        for segment in reversed(_journal_segments(self.journal_path)):
+            if _last_journal_seq(segment) <= self.seq:
+                break
+            segments.append(segment)
+        segments.reverse()
+        if os.path.exists(self.journal_path):
+            segments.append(self.journal_path)
+        applied = 0
+        for segment in segments:
+            with open(segment, "rb") as f:
+                for line in f:
+                    try:
+                        rec = _decode_json(line)
+                    except Exception:
+                        continue  # línea cortada por un crash
+                    if rec.get("s", 0) <= self.seq:
+                        continue  # ya está en el snapshot
+                    _apply_journal(data, rec)
+                    self.seq = rec["s"]
+                    applied += 1
+        if os.path.exists(self.journal_path):
+            self.journal_bytes = os.path.getsize(self.journal_path)
+        if applied:
+            print(f"✅ Journal: {applied} cambio(s) aplicados sobre el snapshot ({len(segments)} segmento(s)).")
+        return data
+
+    def needs_full_snapshot(self, guilds: set) -> bool:
+        return bool(guilds) or not self.journal_path or self.journal_bytes >= JOURNAL_MAX_BYTES
+
+    def _append(self, data: dict, configs: set, events: list):
+        records = []
+        for gid in configs:
+            g = data.get("guilds", {}).get(gid)
+            if g is None:
+                continue
+            config, prev = _config_of(g), self._configs.get(gid, {})
+            changed = {k: v for k, v in config.items() if k not in prev or prev[k] != v}
+            removed = [k for k in prev if k not in config]
+            if changed or removed:
+                rec = {"op": "config", "g": gid, "t": now_utc().isoformat(), "v": changed}
+                if removed:
+                    rec["x"] = removed
+                records.append(rec)
+            self._configs[gid] = config
+        for gid, uid, censo_id, ts, u in events:
+            records.append({"op": "user", "g": gid, "u": uid, "c": censo_id, "t": ts, "v": u})
+        if not records:
+            return
+        for rec in records:
+            self.seq += 1
+            rec["s"] = self.seq
+        if self._fh is None:
+            _ensure_folder(self.journal_path)
+            self._fh = open(self.journal_path, "ab")
+        raw = b"".join(_encode_json(rec) + b"\n" for rec in records)
+        self._fh.write(raw)
+        self._fh.flush()
+        now = time.monotonic()
+        if FSYNC_INTERVAL <= 0 or now - self.last_fsync >= FSYNC_INTERVAL:
+            os.fsync(self._fh.fileno())
+            self.last_fsync = now
+        self.journal_bytes += len(raw)
+
+    def _compact(self, data: dict):
+        # snapshot nuevo primero; si el proceso muere antes de rotar el journal,
+        # al arrancar se ignoran las líneas con s <= journal_seq
+        _write_data_file({**data, "journal_seq": self.seq}, self.writer)
+        self._configs = {gid: _config_of(g) for gid, g in data.get("guilds", {}).items()}
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+        if not self.journal_path or not os.path.exists(self.journal_path):
+            return
+        backups = _backup_files(self.path)
+        if (JOURNAL_ARCHIVES > 0 or backups) and self.journal_bytes > 0:
+            os.replace(self.journal_path, f"{self.journal_path}.{now_utc().strftime('%Y%m%dT%H%M%S%f')}")
+            # FIX: los segmentos posteriores al backup más viejo no se borran (son los que
+            # llevan ese backup al estado actual); los demás, pasado JOURNAL_ARCHIVES
+            oldest_backup = backups[-1].rsplit(".bak-", 1)[1] if backups else None
+            segments = _journal_segments(self.journal_path)
+            for old in segments[:max(0, len(segments) - JOURNAL_ARCHIVES)]:
+                if oldest_backup is not None and old.rsplit(".", 1)[1] >= oldest_backup:
+                    continue
+                with contextlib.suppress(OSError):
+                    os.remove(old)
+        else:
+            os.remove(self.journal_path)
+        self.journal_bytes = 0
+
+    def write(self, data: dict, guilds: set, configs: set, users: set, events: list = (), full: bool = True):
+        if self.journal_path:
+            self._append(data, configs, events)  # también antes de compactar: el rastro queda completo
+        if full:
+            self._compact(data)
+
+    def count_statuses(self, data: dict, gid: str) -> dict:
+        counts = {}
+        g = data.get("guilds", {}).get(gid) or {}
+        for u in g.get("users", {}).values():
+            st = u.get("status", "PENDING")
+            counts[st] = counts.get(st, 0) + 1
+        return counts
+
+    def close(self):
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS guilds (
+    guild_id TEXT PRIMARY KEY,
+    config TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS censos (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    guild_id TEXT NOT NULL,
+    censo_id TEXT,
+    deadline_utc TEXT,
+    current INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_censos_guild ON censos (guild_id, current);
+CREATE TABLE IF NOT EXISTS censo_users (
+    censo_id INTEGER NOT NULL,
+    user_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_sent_utc TEXT,
+    response_utc TEXT,
+    extra TEXT,
+    PRIMARY KEY (censo_id, user_id)
+);
+CREATE INDEX IF NOT EXISTS idx_censo_users_status ON censo_users (censo_id, status);
+-- índice de la antigua consulta de vencidos (los recordatorios los lleva el heap): fuera en bases viejas
+DROP INDEX IF EXISTS idx_censo_users_sent;
+CREATE TABLE IF NOT EXISTS censo_archive (
+    guild_id TEXT NOT NULL,
+    censo_id TEXT NOT NULL,
+    archived_utc TEXT NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (guild_id, censo_id)
+);
+"""
+
+class SqliteBackend:  # NUEVO
+    # Config por guild en una fila + una fila por usuario y censo: responder
+    # actualiza solo la fila del usuario. censos.current=1 marca el censo vigente;
+    # el resto son el historial.
+    queries_disk = True
+    journaled = False
+
+    def __init__(self, path: str = DB_FILE):
+        self.path = path
+        self.conn: sqlite3.Connection | None = None
+        self._current: dict[str, int] = {}  # guild_id -> censos.id vigente
+        self._known: set[str] = set()       # guilds con fila de config
+        self.archive = SqliteArchive(self)  # NUEVO: historial comprimido, una fila por censo
+
+    def _connect(self) -> sqlite3.Connection:
+        if self.conn is None:
+            _ensure_folder(self.path)
+            self.conn = sqlite3.connect(self.path, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.executescript(SQLITE_SCHEMA)
+        return self.conn
+
+    def is_empty(self) -> bool:
+        return self._connect().execute("SELECT 1 FROM guilds LIMIT 1").fetchone() is None
+
+    def load(self) -> dict:
+        conn = self._connect()
+        if self.is_empty() and os.path.exists(DATA_FILE):
+            n = import_json_to_sqlite(DATA_FILE, self)
+            print(f"✅ Importados {n} guild(s) de {DATA_FILE} a {self.path}.")
+
+        data = {"guilds": {}}
+        for gid, config in conn.execute("SELECT guild_id, config FROM guilds"):
+            g = json.loads(config)
+            g["users"] = {}
+            g["history"] = []
+            data["guilds"][gid] = g
+            self._known.add(gid)
+
+        self._current = {}
+        rows = conn.execute("SELECT id, guild_id, censo_id, deadline_utc, current FROM censos ORDER BY id").fetchall()
+        for rowid, gid, censo_id, deadline_utc, current in rows:
+            g = data["guilds"].get(gid)
+            if g is None:
+                continue
+            users = self._load_users(conn, rowid)
+            if current:
+                g["users"] = users
+                self._current[gid] = rowid
+            else:
+                g["history"].append({"censo_id": censo_id, "deadline_utc": deadline_utc, "users": users})
+        return data
+
+    def _load_users(self, conn: sqlite3.Connection, rowid: int) -> dict:
+        users = {}
+        q = "SELECT user_id, status, attempts, last_sent_utc, response_utc, extra FROM censo_users WHERE censo_id = ?"
+        for uid, status, attempts, last_sent, response, extra in conn.execute(q, (rowid,)):
+            u = json.loads(extra) if extra else {}
+            u.update({"status": status, "attempts": attempts, "last_sent_utc": last_sent, "response_utc": response})
+            users[uid] = u
+        return users
+
+    def needs_full_snapshot(self, guilds: set) -> bool:
+        return False  # solo lee los guilds y usuarios tocados
+
+    def write(self, data: dict, guilds: set, configs: set, users: set, events: list = (), full: bool = False):
+        conn = self._connect()
+        all_guilds = data.get("guilds", {})
+        with conn:
+            for gid in guilds:
+                if gid in all_guilds:
+                    self._write_guild(conn, gid, all_guilds[gid])
+            for gid in configs - guilds:
+                if gid in all_guilds:
+                    self._write_config(conn, gid, all_guilds[gid])
+            for gid, uid in users:
+                if gid in guilds or gid not in all_guilds:
+                    continue
+                u = all_guilds[gid].get("users", {}).get(uid)
+                if gid not in self._known:
+                    self._write_config(conn, gid, all_guilds[gid])
+                if u is not None:
+                    self._write_user(conn, self._current_rowid(conn, gid, all_guilds[gid]), uid, u)
+
+    def _write_config(self, conn: sqlite3.Connection, gid: str, g: dict):
+        config = {k: v for k, v in g.items() if k not in ("users", "history")}
+        conn.execute(
+            "INSERT INTO guilds (guild_id, config) VALUES (?, ?) "
+            "ON CONFLICT(guild_id) DO UPDATE SET config = excluded.config",
+            (gid, json.dumps(config, ensure_ascii=False)),
+        )
+        self._known.add(gid)
+        if gid in self._current:
+            conn.execute(
+                "UPDATE censos SET censo_id = ?, deadline_utc = ? WHERE id = ?",
+                (g.get("censo_id"), g.get("deadline_utc"), self._current[gid]),
+            )
+
+    def _write_guild(self, conn: sqlite3.Connection, gid: str, g: dict):
+        # Reescritura estructural (nuevo censo, historial): solo para este guild
+        self._write_config(conn, gid, g)
+        conn.execute("DELETE FROM censo_users WHERE censo_id IN (SELECT id FROM censos WHERE guild_id = ?)", (gid,))
+        conn.execute("DELETE FROM censos WHERE guild_id = ?", (gid,))
+        self._current.pop(gid, None)
+        for h in g.get("history", []):
+            cur = conn.execute(
+                "INSERT INTO censos (guild_id, censo_id, deadline_utc, current) VALUES (?, ?, ?, 0)",
+                (gid, h.get("censo_id"), h.get("deadline_utc")),
+            )
+            for uid, u in (h.get("users") or {}).items():
+                self._write_user(conn, cur.lastrowid, uid, u)
+        rowid = self._current_rowid(conn, gid, g)
+        for uid, u in g.get("users", {}).items():
+            self._write_user(conn, rowid, uid, u)
+
+    def _current_rowid(self, conn: sqlite3.Connection, gid: str, g: dict) -> int:
+        if gid not in self._current:
+            cur = conn.execute(
+                "INSERT INTO censos (guild_id, censo_id, deadline_utc, current) VALUES (?, ?, ?, 1)",
+                (gid, g.get("censo_id"), g.get("deadline_utc")),
+            )
+            self._current[gid] = cur.lastrowid
+        return self._current[gid]
+
+    def _write_user(self, conn: sqlite3.Connection, rowid: int, uid: str, u: dict):
+        extra = {k: v for k, v in u.items() if k not in USER_FIELDS}
+        conn.execute(
+            "INSERT OR REPLACE INTO censo_users "
+            "(censo_id, user_id, status, attempts, last_sent_utc, response_utc, extra) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                rowid, str(uid), u.get("status", "PENDING"), int(u.get("attempts", 0)),
+                u.get("last_sent_utc"), u.get("response_utc"),
+                json.dumps(extra, ensure_ascii=False) if extra else None,
+            ),
+        )
+
+    def count_statuses(self, data: dict, gid: str) -> dict:
+        rowid = self._current.get(gid)
+        if rowid is None:
+            return {}
+        q = "SELECT status, COUNT(*) FROM censo_users WHERE censo_id = ? GROUP BY status"
+        return dict(self._connect().execute(q, (rowid,)).fetchall())
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+def import_json_to_sqlite(json_path: str = DATA_FILE, backend: "SqliteBackend | None" = None) -> int:
+    # NUEVO: importador único censo_data.json -> SQLite (reescribe los guilds importados)
+    backend = backend or SqliteBackend(DB_FILE)
+    # con el journal aplicado si es el archivo de datos del bot
+    data = JsonBackend(json_path, JOURNAL_FILE if json_path == DATA_FILE else None).load()
+    guilds = set(data.get("guilds", {}).keys())
+    backend.write(data, guilds, set(), set())
+    return len(guilds)
+
+# =========================
+# Archivo histórico de censos (comprimido, fuera del estado caliente)
+# =========================
+# NUEVO: cada censo terminado se guarda aparte (un .json.gz por censo o una fila
+# en SQLite) y solo se lee cuando alguien pide historial o reportes.
+HISTORY_DIR = os.getenv("CENSO_HISTORY_DIR", "censo_history")
+HISTORY_KEEP = int(os.getenv("CENSO_HISTORY_KEEP", "5"))  # censos archivados por guild (0 = sin límite)
+
+def _censo_sort_key(censo_id: str) -> int:
+    # censo_id = "<guild>-<timestamp>" (con "~sufijo" si chocó con uno ya archivado)
+    try:
+        return int(str(censo_id).split("~", 1)[0].rsplit("-", 1)[-1])
+    except ValueError:
+        return 0
+
+class FileArchive:  # NUEVO
+    def __init__(self, folder: str = HISTORY_DIR):
+        self.folder = folder
+
+    def _path(self, gid: str, censo_id: str) -> str:
+        return os.path.join(self.folder, str(gid), f"{censo_id}.json.gz")
+
+    def put(self, gid: str, entry: dict):
+        path = self._path(gid, entry["censo_id"])
+        if os.path.exists(path):
+            raise FileExistsError(path)  # FIX: nunca pisar un censo archivado
+        _ensure_folder(path)
+        with open(path + ".tmp", "wb") as f:
+            f.write(gzip.compress(_encode_json(entry)))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+        if HISTORY_KEEP > 0:
+            for censo_id in self.list(gid)[HISTORY_KEEP:]:
+                with contextlib.suppress(OSError):
+                    os.remove(self._path(gid, censo_id))
+
+    def list(self, gid: str) -> list[str]:
+        # más reciente primero
+        try:
+            names = os.listdir(os.path.join(self.folder, str(gid)))
+        except OSError:
+            return []
+        ids = [n[:-len(".json.gz")] for n in names if n.endswith(".json.gz")]
+        return sorted(ids, key=_censo_sort_key, reverse=True)
+
+    def get(self, gid: str, censo_id: str) -> dict | None:
+        try:
+            with open(self._path(gid, censo_id), "rb") as f:
+                return _decode_json(gzip.decompress(f.read()))
+        except FileNotFoundError:
+            return None
+
+class SqliteArchive:  # NUEVO
+    def __init__(self, backend: "SqliteBackend"):
+        self.backend = backend
+
+    def put(self, gid: str, entry: dict):
+        conn = self.backend._connect()
+        with conn:
+            try:
+                conn.execute(
+                    "INSERT INTO censo_archive (guild_id, censo_id, archived_utc, data) VALUES (?, ?, ?, ?)",
+                    (str(gid), entry["censo_id"], now_utc().isoformat(), gzip.compress(_encode_json(entry))),
+                )
+            except sqlite3.IntegrityError:
+                raise FileExistsError(f"{gid}/{entry['censo_id']}") from None  # FIX: nunca pisar
+            if HISTORY_KEEP > 0:
+                conn.execute(
+                    "DELETE FROM censo_archive WHERE guild_id = ? AND censo_id NOT IN "
+                    "(SELECT censo_id FROM censo_archive WHERE guild_id = ? ORDER BY archived_utc DESC LIMIT ?)",
+                    (str(gid), str(gid), HISTORY_KEEP),
+                )
+
+    def list(self, gid: str) -> list[str]:
+        q = "SELECT censo_id FROM censo_archive WHERE guild_id = ? ORDER BY archived_utc DESC"
+        return [r[0] for r in self.backend._connect().execute(q, (str(gid),))]
+
+    def get(self, gid: str, censo_id: str) -> dict | None:
+        q = "SELECT data FROM censo_archive WHERE guild_id = ? AND censo_id = ?"
+        row = self.backend._connect().execute(q, (str(gid), censo_id)).fetchone()
+        return _decode_json(gzip.decompress(row[0])) if row else None
+
+# =========================
+# Estado en memoria + escritura diferida
+# =========================
+class CensoStore:  # NUEVO
+    # Un único dict en memoria (se lee del disco una vez). Las mutaciones lo marcan
+    # "sucio" y un writer en segundo plano agrupa los cambios en una sola escritura
+    # como máximo cada SAVE_DELAY segundos. El backend decide qué tan granular
+    # es esa escritura (documento completo en JSON, filas sueltas en SQLite).
+    # NUEVO: el loop solo copia el estado (snapshot); codificar y escribir corre
+    # en un hilo dedicado, así el heartbeat y los clics no esperan al disco.
+    def __init__(self, backend=None):
+        self.backend = backend or (SqliteBackend(DB_FILE) if STORAGE_BACKEND == "sqlite" else JsonBackend())
+        self.data: dict | None = None
+        self.dirty = False
+        self._dirty_guilds: set[str] = set()
+        self._dirty_configs: set[str] = set()
+        self._dirty_users: set[tuple[str, str]] = set()
+        self._events: list[tuple] = []  # NUEVO: cambios de usuario en orden (journal)
+        self._wake: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self._io = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="censo-writer")
+        self._io_lock = threading.Lock()  # backend: un solo usuario a la vez (hilo o loop)
+
+    def _load(self) -> dict:
+        with self._io_lock, metrics.timer("censo_load_seconds"):  # NUEVO
+            data = self.backend.load()
+        data.setdefault("guilds", {})
+        return data
+
+    def get(self) -> dict:
+        if self.data is None:
+            self.data = self._load()
+        return self.data
+
+    async def load(self):
+        # carga inicial fuera del loop
+        if self.data is None:
+            data = await asyncio.get_running_loop().run_in_executor(self._io, self._load)
+            if self.data is None:
+                self.data = data
+
+    def _archive_put(self, gid: str, entry: dict) -> str:
+        # FIX: si el id ya está archivado con otro contenido, va con sufijo "~N"
+        # (el mismo contenido = ya estaba movido: reintento tras un crash)
+        base, n = entry["censo_id"], 1
+        with self._io_lock:
+            while True:
+                try:
+                    self.backend.archive.put(gid, entry)
+                    break
+                except FileExistsError:
+                    if self.backend.archive.get(gid, entry["censo_id"]) == entry:
+                        break
+                    n += 1
+                    entry = {**entry, "censo_id": f"{base}~{n}"}
+        if n > 1:
+            print(f"⚠️ Historial: {base} ya estaba archivado; guardado como {entry['censo_id']}")
+        return entry["censo_id"]
+
+    async def archive_censo(self, guild_id, entry: dict) -> str:
+        # NUEVO: censo terminado -> archivo histórico (en el hilo del writer)
+        return await asyncio.get_running_loop().run_in_executor(self._io, self._archive_put, str(guild_id), entry)
+
+    async def history(self, guild_id) -> list[str]:
+        def run():
+            with self._io_lock:
+                return self.backend.archive.list(str(guild_id))
+        return await asyncio.get_running_loop().run_in_executor(self._io, run)
+
+    async def archived_censo(self, guild_id, censo_id: str) -> dict | None:
+        def run():
+            with self._io_lock:
+                return self.backend.archive.get(str(guild_id), censo_id)
+        return await asyncio.get_running_loop().run_in_executor(self._io, run)
+
+    def migrate_history(self) -> int:
+        # NUEVO: g["history"] heredado (del JSON o de filas viejas en SQLite) -> archivo
+        moved = 0
+        for gid, g in self.get()["guilds"].items():
+            entries = g.pop("history", None)
+            if not entries:
+                continue
+            for entry in entries:
+                if not entry.get("censo_id"):
+                    continue
+                if entry["censo_id"] == g.get("censo_id"):
+                    # FIX: el start_censo viejo guardaba el censo anterior con el id del nuevo;
+                    # con su id el próximo inicio lo pisaría al archivar el censo vigente
+                    entry = {**entry, "censo_id": f"{entry['censo_id']}~previo", "legacy_censo_id": entry["censo_id"]}
+                self._archive_put(gid, entry)
+                moved += 1
+            self.mark_guild(gid)
+        if moved:
+            print(f"✅ Historial: {moved} censo(s) movidos al archivo comprimido.")
+        return moved
+
+    def _touch(self):
+        self.dirty = True
+        if self._wake is not None:
+            self._wake.set()
+
+    def mark_dirty(self):
+        self._dirty_guilds.update(self.get()["guilds"].keys())
+        self._touch()
+
+    def mark_guild(self, guild_id):
+        self._dirty_guilds.add(str(guild_id))
+        self._touch()
+
+    def mark_config(self, guild_id):
+        self._dirty_configs.add(str(guild_id))
+        self._touch()
+
+    def mark_user(self, guild_id, user_id):
+        gid, uid = str(guild_id), str(user_id)
+        self._dirty_users.add((gid, uid))
+        if self.backend.journaled:
+            # cada transición queda en el journal (no solo el estado final del lote)
+            g = self.get()["guilds"].get(gid) or {}
+            u = g.get("users", {}).get(uid)
+            if u is not None:
+                self._events.append((gid, uid, g.get("censo_id"), now_utc().isoformat(), dict(u)))
+        self._touch()
+
+    def _take(self):
+        # en el loop: toma lo sucio y copia lo que el backend va a leer
+        if not self.dirty or self.data is None:
+            return None
+        guilds, configs, users, events = self._dirty_guilds, self._dirty_configs, self._dirty_users, self._events
+        self._dirty_guilds, self._dirty_configs, self._dirty_users, self._events = set(), set(), set(), []
+        self.dirty = False
+        full = self.backend.needs_full_snapshot(guilds)
+        if full:
+            snapshot = _snapshot(self.data)
+        else:
+            # guilds reescritos completos; del resto solo config + usuarios tocados
+            snapshot = {"guilds": {gid: _snapshot(self.data["guilds"][gid]) for gid in guilds if gid in self.data["guilds"]}}
+            for gid in configs | {gid for gid, _ in users}:
+                g = self.data["guilds"].get(gid)
+                if g is None or gid in snapshot["guilds"]:
+                    continue
+                part = _snapshot(_config_of(g))
+                part["users"] = {uid: dict(g["users"][uid]) for ugid, uid in users if ugid == gid and uid in g.get("users", {})}
+                snapshot["guilds"][gid] = part
+        return snapshot, guilds, configs, users, events, full
+
+    def _write(self, batch):
+        # en el hilo del writer (o en flush() al cerrar)
+        snapshot, guilds, configs, users, events, full = batch
+        with self._io_lock, metrics.timer("censo_save_seconds"):  # NUEVO
+            self.backend.write(snapshot, guilds, configs, users, events=events, full=full)
+        with contextlib.suppress(OSError):
+            metrics.set("censo_data_bytes", os.path.getsize(self.backend.path))
+
+    def _retry(self, batch, e: Exception):
+        # reintentar en el próximo ciclo
+        _, guilds, configs, users, events, _ = batch
+        self._dirty_guilds |= guilds
+        self._dirty_configs |= configs
+        self._dirty_users |= users
+        self._events[:0] = events
+        self._touch()
+        print("❌ Error guardando datos:", repr(e))
+
+    def flush(self):
+        # síncrono: cierre, atexit y consultas que necesitan el disco al día
+        batch = self._take()
+        if batch is None:
+            return
+        try:
+            self._write(batch)
+        except Exception as e:
+            self._retry(batch, e)
+
+    async def flush_async(self):
+        batch = self._take()
+        if batch is None:
+            return
+        try:
+            await asyncio.get_running_loop().run_in_executor(self._io, self._write, batch)
+        except Exception as e:
+            self._retry(batch, e)
+
+    def count_statuses(self, guild_id) -> dict:
+        if self.backend.queries_disk:
+            self.flush()
+            with self._io_lock:
+                return self.backend.count_statuses(self.get(), str(guild_id))
+        return self.backend.count_statuses(self.get(), str(guild_id))
+
+    async def _writer(self):
+        while True:
+            await self._wake.wait()
+            await asyncio.sleep(SAVE_DELAY)  # agrupa todos los cambios de la ventana
+            self._wake.clear()
+            await self.flush_async()
+
+    def start(self):
+        self.get()
+        if self._task is None or self._task.done():
+            self._wake = asyncio.Event()
+            if self.dirty:
+                self._wake.set()
+            self._task = asyncio.create_task(self._writer())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush_async()
+        self._io.shutdown(wait=True)
+        self.flush()  # por si el último intento falló
+        self.backend.close()
+
+store = CensoStore()  # NUEVO
+
+def load_data() -> dict:
+    # NUEVO: devuelve el estado en memoria (sin releer el archivo)
+    return store.get()
+
+# NUEVO: marcas granulares (en SQLite evitan reescribir todo el guild)
+def save_guild(guild_id: int):
+    store.mark_guild(guild_id)
+
+def save_config(guild_id: int):
+    store.mark_config(guild_id)
+
+def save_user(guild_id: int, user_id):
+    store.mark_user(guild_id, user_id)
 
 def ensure_guild(data: dict, guild_id: int) -> dict:
     data.setdefault("guilds", {})
@@ -45,7 +998,7 @@ def ensure_guild(data: dict, guild_id: int) -> dict:
     g = data["guilds"].setdefault(gid, {})
     g.setdefault("active", False)
     g.setdefault("paused", False)
-    g.setdefault("busy", False)  # NUEVO: lock para evitar choques start/scheduler
+    g.pop("busy", None)  # NUEVO: el lock ahora vive en memoria (guild_locks)
     g.setdefault("censo_id", None)
     g.setdefault("role_id", None)          # rol objetivo
     g.setdefault("role_no_id", None)       # antiguo miembro
@@ -57,175 +1010,279 @@ def ensure_guild(data: dict, guild_id: int) -> dict:
     g.setdefault("panel_channel_id", None)  # NUEVO
     g.setdefault("panel_message_id", None)  # NUEVO
     g.setdefault("answers_log", [])  # NUEVO: historial de respuestas
-    g.setdefault("history", [])      # NUEVO: historial de censos
     return g
 
 # =========================
-# View de respuesta en DM
+# Índice de estados por censo (contadores incrementales)
 # =========================
-class CensoDMView(discord.ui.View):
-    def __init__(self, bot: commands.Bot, guild_id: int, censo_id: str, user_id: int):
-        super().__init__(timeout=None)
-        self.bot = bot
-        self.guild_id = guild_id
-        self.censo_id = censo_id
-        self.user_id = user_id
+# NUEVO: estado -> set de user_ids del censo vigente. Toda transición pasa por
+# set_user_status, así el panel cuenta en O(1) y "quién está pendiente / con DM
+# fallido" no recorre el roster. Se reconstruye desde las filas al arrancar.
+STATUSES = ("YES", "NO", "PENDING", "DM_FAILED", "EXPIRED", "REMOVED")  # REMOVED: salió del roster
 
-    async def _apply_answer(self, interaction: discord.Interaction, answer: str):
-        if interaction.user.id != self.user_id:
-            await interaction.response.send_message("❌ Este mensaje no es para ti.", ephemeral=True)
-            return
-
-        data = load_data()
-        g = ensure_guild(data, self.guild_id)
-
-        if not g.get("active") or g.get("censo_id") != self.censo_id:
-            await interaction.response.send_message("⚠️ Este censo ya no está activo.", ephemeral=True)
-            return
-
-        ukey = str(self.user_id)
-        u = g["users"].setdefault(ukey, {
-            "status": "PENDING",
-            "attempts": 0,
-            "last_sent_utc": None,
-            "response_utc": None
-        })
+class StatusIndex:  # NUEVO
+    def __init__(self, censo_id: str | None):
+        self.censo_id = censo_id
+        self.by_status: dict[str, set[str]] = {st: set() for st in STATUSES}
+
+    @classmethod
+    def build(cls, g: dict) -> "StatusIndex":
+        idx = cls(g.get("censo_id"))
+        for uid, u in g.get("users", {}).items():
+            idx.by_status.setdefault(u.get("status", "PENDING"), set()).add(uid)
+        return idx
+
+    def counts(self) -> dict:
+        return {st: len(uids) for st, uids in self.by_status.items()}
+
+    def members(self, *statuses: str) -> list[str]:
+        return [uid for st in statuses for uid in self.by_status.get(st, ())]
+
+    def move(self, uid: str, old: str | None, new: str):
+        if old is not None:
+            self.by_status.get(old, set()).discard(uid)
+        self.by_status.setdefault(new, set()).add(uid)
+
+STATUS_INDEXES: dict[int, StatusIndex] = {}
+
+def status_index(guild_id: int, g: dict | None = None) -> StatusIndex:
+    g = g if g is not None else ensure_guild(load_data(), guild_id)
+    idx = STATUS_INDEXES.get(int(guild_id))
+    if idx is None or idx.censo_id != g.get("censo_id"):
+        idx = STATUS_INDEXES[int(guild_id)] = StatusIndex.build(g)
+    return idx
+
+def set_user_status(guild_id: int, g: dict, uid: str, status: str, **fields) -> dict:
+    # única vía para cambiar el estado de un usuario del censo vigente
+    uid = str(uid)
+    u = g["users"].get(uid)
+    old = u.get("status", "PENDING") if u is not None else None
+    if u is None:
+        u = g["users"][uid] = {"status": status, "attempts": 0, "last_sent_utc": None, "response_utc": None}
+    u["status"] = status
+    u.update(fields)
+    status_index(guild_id, g).move(uid, old, status)
+    save_user(guild_id, uid)
+    reminders.on_user_update(guild_id, g, uid, u)  # NUEVO: reprograma/cancela su recordatorio
+    return u
+
+def rebuild_status_indexes() -> int:
+    # chequeo de consistencia al arrancar: contadores = lo que dicen las filas
+    STATUS_INDEXES.clear()
+    mismatched = 0
+    for gid_str, g in load_data().get("guilds", {}).items():
+        idx = status_index(int(gid_str), g)
+        stored = {k: v for k, v in store.count_statuses(gid_str).items() if v}
+        if stored != {k: v for k, v in idx.counts().items() if v}:
+            mismatched += 1
+            print(f"⚠️ Contadores del guild {gid_str} no coinciden con el almacenamiento: {stored} vs {idx.counts()}")
+    return mismatched
 
-        if u.get("status") in ("YES", "NO"):
-            await interaction.response.send_message("✅ Ya habías respondido. Gracias.", ephemeral=True)
-            return
+# =========================
+# Locks por guild (en memoria)
+# =========================
+# NUEVO: reemplaza el flag "busy" persistido. Las operaciones esperan su turno en
+# vez de fallar, y un crash no deja el guild bloqueado (el lock no va a disco).
+LOCK_LEASE_SECONDS = float(os.getenv("CENSO_LOCK_LEASE", "120"))
 
-        u["status"] = "YES" if answer == "YES" else "NO"
-        u["response_utc"] = now_utc().isoformat()
+class GuildLocks:  # NUEVO
+    def __init__(self):
+        self._locks: dict[int, asyncio.Lock] = {}
+        self.holders: dict[int, tuple[str, datetime, float]] = {}  # guild -> (quién, desde, monotonic)
+
+    def holder(self, guild_id: int) -> tuple[str, datetime] | None:
+        h = self.holders.get(int(guild_id))
+        return (h[0], h[1]) if h else None
+
+    @contextlib.asynccontextmanager
+    async def hold(self, guild_id: int, who: str):
+        gid = int(guild_id)
+        while True:
+            lock = self._locks.setdefault(gid, asyncio.Lock())
+            try:
+                await asyncio.wait_for(lock.acquire(), timeout=LOCK_LEASE_SECONDS)
+            except asyncio.TimeoutError:
+                h = self.holders.get(gid)
+                if h and time.monotonic() - h[2] >= LOCK_LEASE_SECONDS and self._locks.get(gid) is lock:
+                    # lease vencido: el dueño quedó colgado; se reemplaza el lock
+                    print(f"⚠️ Lock de guild {gid} vencido (tenía: {h[0]} desde {h[1].isoformat()}); se libera.")
+                    self._locks[gid] = asyncio.Lock()
+                    self.holders.pop(gid, None)
+                continue
+            if self._locks.get(gid) is not lock:
+                lock.release()  # lo reemplazaron mientras esperábamos
+                continue
+            break
 
-        # NUEVO: guardar historial de respuestas (últimas 20)
+        self.holders[gid] = (who, now_utc(), time.monotonic())
         try:
-            g.setdefault("answers_log", [])
-            g["answers_log"].append({
-                "ts": now_utc().isoformat(),
-                "user_id": self.user_id,
-                "answer": answer
-            })
-            g["answers_log"] = g["answers_log"][-20:]
-        except Exception:
-            pass
+            yield
+        finally:
+            if self._locks.get(gid) is lock:
+                self.holders.pop(gid, None)
+            lock.release()
 
-        save_data(data)
+guild_locks = GuildLocks()  # NUEVO
 
-        # FIX: responder primero a Discord (evita "interrumpido")
-        try:  # FIX
-            if not interaction.response.is_done():  # FIX
-                await interaction.response.send_message("✅ Respuesta registrada. Gracias.", ephemeral=True)  # FIX
-        except Exception:  # FIX
-            pass  # FIX
+# =========================
+# Respuesta en DM (botones dinámicos: un solo registro, sin vista por mensaje)
+# =========================
+# NUEVO: latencia clic → ack de las últimas respuestas (p50/p99 en el panel), medida
+# desde interaction.created_at
+ACK_LATENCY_SAMPLES = int(os.getenv("CENSO_ACK_SAMPLES", "1000"))
+
+class LatencyWindow:  # NUEVO
+    def __init__(self, maxlen: int):
+        self.samples = collections.deque(maxlen=maxlen)
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, p: float) -> float | None:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+ACK_LATENCY = LatencyWindow(ACK_LATENCY_SAMPLES)
+
+# NUEVO: el custom_id lleva guild/censo/usuario; los botones funcionan tras reinicios
+# y la memoria no crece con cada DM o recordatorio.
+async def apply_censo_answer(bot: commands.Bot, interaction: discord.Interaction, guild_id: int, censo_id: str, user_id: int, answer: str):
+    started = time.perf_counter()
+    if interaction.user.id != user_id:
+        await interaction.response.send_message("❌ Este mensaje no es para ti.", ephemeral=True)
+        return
 
-        # FIX: refrescar panel DESPUÉS de responder
-        await refresh_panel_message(self.bot, self.guild_id)  # FIX
+    data = load_data()
+    g = ensure_guild(data, guild_id)
 
-        guild = self.bot.get_guild(self.guild_id)
-        if not guild:
-            return
+    if not g.get("active") or g.get("censo_id") != censo_id:
+        await interaction.response.send_message("⚠️ Este censo ya no está activo.", ephemeral=True)
+        return
 
-        member = guild.get_member(self.user_id)
-        if member is None:  # FIX
-            try:  # FIX
-                member = await guild.fetch_member(self.user_id)  # FIX
-            except Exception as e:  # FIX
-                print("❌ No pude fetch_member:", repr(e))  # FIX
-                member = None  # FIX
+    ukey = str(user_id)
+    u = g["users"].get(ukey) or {}
 
-        if not member:
-            return
+    if u.get("status") in ("YES", "NO"):
+        await interaction.response.send_message("✅ Ya habías respondido. Gracias.", ephemeral=True)
+        return
 
-        role_target = guild.get_role(int(g["role_id"])) if g.get("role_id") else None
-        role_no = guild.get_role(int(g["role_no_id"])) if g.get("role_no_id") else None
-        role_pending = guild.get_role(int(g["role_pending_id"])) if g.get("role_pending_id") else None
+    # FIX: retirado por el roster dinámico (perdió el rol o salió): ya no cuenta en este censo
+    if u.get("status") == "REMOVED":
+        await interaction.response.send_message("⚠️ Ya no formas parte de este censo.", ephemeral=True)
+        return
 
-        log_channel = guild.get_channel(int(g["log_channel_id"])) if g.get("log_channel_id") else None
+    u = set_user_status(guild_id, g, ukey, "YES" if answer == "YES" else "NO", response_utc=now_utc().isoformat())
+
+    # FIX: responder primero a Discord (evita "interrumpido"); lo demás va en segundo plano
+    try:  # FIX
+        if not interaction.response.is_done():  # FIX
+            await interaction.response.send_message("✅ Respuesta registrada. Gracias.", ephemeral=True)  # FIX
+    except Exception:  # FIX
+        pass  # FIX
+    # FIX: clic -> ack se mide desde el snowflake de la interacción (incluye gateway y cola
+    # antes del dispatch); puede salir < 0 con el reloj del host adelantado, se recorta a 0
+    click_to_ack = max(0.0, (discord.utils.utcnow() - interaction.created_at).total_seconds())
+    ACK_LATENCY.record(click_to_ack)  # NUEVO
+    metrics.observe("censo_answer_ack_seconds", click_to_ack)  # NUEVO
+    metrics.observe("censo_answer_handler_seconds", time.perf_counter() - started)
+
+    # NUEVO: guardar historial de respuestas (últimas 20)
+    try:
+        g.setdefault("answers_log", [])
+        g["answers_log"].append({
+            "ts": now_utc().isoformat(),
+            "user_id": user_id,
+            "answer": answer
+        })
+        g["answers_log"] = g["answers_log"][-20:]
+    except Exception:
+        pass
 
-        # FIX: referencia robusta al "member del bot" (guild.me a veces es None)
-        bot_member = guild.me  # FIX
-        if bot_member is None:  # FIX
-            try:  # FIX
-                bot_member = guild.get_member(self.bot.user.id)  # FIX
-            except Exception:  # FIX
-                bot_member = None  # FIX
+    save_config(guild_id)  # answers_log
+
+    # FIX: refrescar panel DESPUÉS de responder
+    await refresh_panel_message(bot, guild_id)  # FIX
+
+    # NUEVO: cambios de rol + log van a la cola persistente (reintentos, sobreviven reinicios)
+    jobs.enqueue("answer_roles", f"answer_roles:{censo_id}:{ukey}", guild_id, {
+        "user_id": ukey,
+        "answer": u["status"],
+        "role_id": g.get("role_id"),
+        "role_no_id": g.get("role_no_id"),
+        "role_pending_id": g.get("role_pending_id"),
+    })
+    when = now_utc().strftime('%Y-%m-%d %H:%M UTC')
+    if u["status"] == "YES":
+        content = f"✅ <@{user_id}> confirmó que **sigue activo**. 🕒 {when}"
+    else:
+        content = f"❌ <@{user_id}> indicó que **no continuará** → Rol actualizado. 🕒 {when}"
+    enqueue_log(guild_id, f"{censo_id}:answer:{ukey}", content)
+
+
+class CensoAnswerButton(
+    discord.ui.DynamicItem[discord.ui.Button],
+    template=r"ogt_censo:(?P<answer>yes|no):(?P<guild_id>\d+):(?P<censo_id>[\w-]+):(?P<user_id>\d+)",
+):
+    def __init__(self, answer: str, guild_id: int, censo_id: str, user_id: int):
+        yes = answer == "YES"
+        super().__init__(discord.ui.Button(
+            label="✅ Sí, sigo activo" if yes else "❌ No, me retiro",
+            style=discord.ButtonStyle.success if yes else discord.ButtonStyle.danger,
+            custom_id=f"ogt_censo:{'yes' if yes else 'no'}:{guild_id}:{censo_id}:{user_id}",
+        ))
+        self.answer = answer
+        self.guild_id = guild_id
+        self.censo_id = censo_id
+        self.user_id = user_id
 
-        # quitar rol pendiente si existe
-        try:
-            if role_pending:
-                await member.remove_roles(role_pending, reason="Censo OGT: respondió")
-        except Exception as e:  # FIX
-            print("❌ Error quitando rol pendiente:", repr(e))  # FIX
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: discord.ui.Button, match):
+        return cls(match["answer"].upper(), int(match["guild_id"]), match["censo_id"], int(match["user_id"]))
 
-        if answer == "YES":
-            if log_channel:
-                await log_channel.send(
-                    f"✅ {member.mention} confirmó que **sigue activo**. 🕒 {now_utc().strftime('%Y-%m-%d %H:%M UTC')}"
-                )
-        else:
-            # Quitar rol objetivo + agregar antiguo
-
-            # FIX: diagnóstico rápido antes de tocar roles
-            try:  # FIX
-                if bot_member:  # FIX
-                    print("DEBUG perms manage_roles:", bot_member.guild_permissions.manage_roles)  # FIX
-                    print("DEBUG bot top role:", bot_member.top_role, "pos:", bot_member.top_role.position)  # FIX
-                else:  # FIX
-                    print("DEBUG bot_member: None (no pude obtener member del bot)")  # FIX
-                if role_target:  # FIX
-                    print("DEBUG target role:", role_target, "pos:", role_target.position)  # FIX
-                else:  # FIX
-                    print("DEBUG target role: None")  # FIX
-            except Exception:  # FIX
-                pass  # FIX
+    async def callback(self, interaction: discord.Interaction):
+        await apply_censo_answer(interaction.client, interaction, self.guild_id, self.censo_id, self.user_id, self.answer)
 
-            try:
-                if role_target:
-                    await member.remove_roles(
-                        role_target,
-                        reason="Censo OGT: indicó que no continúa"
-                    )
-                    print("✅ Rol objetivo removido a", member, "rol:", role_target.name)  # FIX
-            except Exception as e:
-                print("❌ Error quitando rol objetivo:", repr(e))  # FIX
-                try:  # FIX
-                    if bot_member:  # FIX
-                        print("   Bot top role:", bot_member.top_role, "| target role:", role_target)  # FIX
-                except Exception:  # FIX
-                    pass  # FIX
 
-            try:
-                if role_no:
-                    await member.add_roles(role_no, reason="Censo OGT: antiguo miembro")
-                    print("✅ Rol NO agregado a", member, "rol:", role_no.name)  # FIX
-            except Exception as e:
-                print("❌ Error agregando rol NO:", repr(e))  # FIX
+class LegacyCensoAnswerButton(discord.ui.DynamicItem[discord.ui.Button], template=r"ogt_censo_(?P<answer>yes|no)"):
+    # DMs enviados antes del cambio (custom_id fijo, sin contexto): se busca el censo activo del usuario
+    def __init__(self, answer: str):
+        yes = answer == "YES"
+        super().__init__(discord.ui.Button(
+            label="✅ Sí, sigo activo" if yes else "❌ No, me retiro",
+            style=discord.ButtonStyle.success if yes else discord.ButtonStyle.danger,
+            custom_id="ogt_censo_yes" if yes else "ogt_censo_no",
+        ))
+        self.answer = answer
 
-            if log_channel:
-                await log_channel.send(
-                    f"❌ {member.mention} indicó que **no continuará** → Rol actualizado. 🕒 {now_utc().strftime('%Y-%m-%d %H:%M UTC')}"
-                )
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: discord.ui.Button, match):
+        return cls(match["answer"].upper())
 
-        # FIX: evita crash si role_target es None o bot_member es None
-        try:  # FIX
-            if bot_member:  # FIX
-                print("DEBUG perms:", bot_member.guild_permissions.manage_roles)  # FIX
-                bot_pos = bot_member.top_role.position  # FIX
-            else:  # FIX
-                bot_pos = None  # FIX
-            target_pos = role_target.position if role_target else None  # FIX
-            print("DEBUG hierarchy bot:", bot_pos, "target:", target_pos)  # FIX
-        except Exception as e:  # FIX
-            print("❌ Error en debug hierarchy:", repr(e))  # FIX
+    async def callback(self, interaction: discord.Interaction):
+        ukey = str(interaction.user.id)
+        candidates = [
+            (int(gid), g) for gid, g in load_data().get("guilds", {}).items()
+            if g.get("active") and ukey in g.get("users", {})
+        ]
+        if interaction.guild_id:
+            candidates = [c for c in candidates if c[0] == interaction.guild_id] or candidates
+        # preferir el censo donde aún no respondió
+        candidates.sort(key=lambda c: c[1]["users"][ukey].get("status") in ("YES", "NO"))
+        if not candidates:
+            await interaction.response.send_message("⚠️ Este censo ya no está activo.", ephemeral=True)
+            return
+        gid, g = candidates[0]
+        await apply_censo_answer(interaction.client, interaction, gid, g["censo_id"], interaction.user.id, self.answer)
 
-    @discord.ui.button(label="✅ Sí, sigo activo", style=discord.ButtonStyle.success, custom_id="ogt_censo_yes")
-    async def yes(self, interaction: discord.Interaction, button: discord.ui.Button):
-        await self._apply_answer(interaction, "YES")
 
-    @discord.ui.button(label="❌ No, me retiro", style=discord.ButtonStyle.danger, custom_id="ogt_censo_no")
-    async def no(self, interaction: discord.Interaction, button: discord.ui.Button):
-        await self._apply_answer(interaction, "NO")
+def censo_dm_view(guild_id: int, censo_id: str, user_id: int) -> discord.ui.View:
+    # vista efímera: solo DynamicItems, discord.py no la guarda por mensaje
+    view = discord.ui.View(timeout=None)
+    view.add_item(CensoAnswerButton("YES", guild_id, censo_id, user_id))
+    view.add_item(CensoAnswerButton("NO", guild_id, censo_id, user_id))
+    return view
 
 # =========================
 # Selects para configuración
@@ -238,7 +1295,7 @@ class RoleTargetSelect(discord.ui.RoleSelect):
         data = load_data()
         g = ensure_guild(data, interaction.guild_id)
         g["role_id"] = self.values[0].id
-        save_data(data)
+        save_config(interaction.guild_id)
         await interaction.response.send_message(f"✅ Rol objetivo guardado: {self.values[0].mention}", ephemeral=True)
 
 class RoleNoSelect(discord.ui.RoleSelect):
@@ -249,7 +1306,7 @@ class RoleNoSelect(discord.ui.RoleSelect):
         data = load_data()
         g = ensure_guild(data, interaction.guild_id)
         g["role_no_id"] = self.values[0].id
-        save_data(data)
+        save_config(interaction.guild_id)
         await interaction.response.send_message(f"✅ Rol NO guardado: {self.values[0].mention}", ephemeral=True)
 
 class RolePendingSelect(discord.ui.RoleSelect):
@@ -261,11 +1318,11 @@ class RolePendingSelect(discord.ui.RoleSelect):
         g = ensure_guild(data, interaction.guild_id)
         if len(self.values) == 0:
             g["role_pending_id"] = None
-            save_data(data)
+            save_config(interaction.guild_id)
             await interaction.response.send_message("✅ Rol Pendiente removido (None).", ephemeral=True)
         else:
             g["role_pending_id"] = self.values[0].id
-            save_data(data)
+            save_config(interaction.guild_id)
             await interaction.response.send_message(f"✅ Rol Pendiente guardado: {self.values[0].mention}", ephemeral=True)
 
 class LogChannelSelect(discord.ui.ChannelSelect):
@@ -281,7 +1338,7 @@ class LogChannelSelect(discord.ui.ChannelSelect):
         data = load_data()
         g = ensure_guild(data, interaction.guild_id)
         g["log_channel_id"] = self.values[0].id
-        save_data(data)
+        save_config(interaction.guild_id)
         await interaction.response.send_message(f"✅ Canal log guardado: {self.values[0].mention}", ephemeral=True)
 
 # =========================
@@ -302,6 +1359,11 @@ class CensoPanelView(discord.ui.View):
         return interaction.user.guild_permissions.administrator or interaction.user.guild_permissions.manage_guild
 
     async def _refresh(self, interaction: discord.Interaction):
+        # NUEVO: el panel guardado pasa por el renderer (coalesce + sin ediciones repetidas)
+        g = ensure_guild(load_data(), interaction.guild_id)
+        if interaction.message and interaction.message.id == g.get("panel_message_id"):
+            await refresh_panel_message(self.bot, interaction.guild_id)
+            return
         embed = build_status_embed(interaction.guild_id)
         try:
             await interaction.message.edit(embed=embed, view=self)
@@ -331,85 +1393,82 @@ class CensoPanelView(discord.ui.View):
     @discord.ui.button(label="▶️ Iniciar (7 días)", style=discord.ButtonStyle.success, row=3)
     async def start_7d(self, interaction: discord.Interaction, button: discord.ui.Button):
         await self._defender(interaction)
-        ok, msg = await start_censo(self.bot, interaction.guild, deadline_days=7)
-        if interaction.guild:
-            await refresh_panel_message(self.bot, interaction.guild.id)  # FIX
+        ok, msg = await start_censo(self.bot, interaction.guild, deadline_days=7)  # toma el lock adentro
         await self._safe_reply(interaction, ("✅ " if ok else "❌ ") + msg)
         await self._refresh(interaction)
 
     @discord.ui.button(label="⏸️ Pausar", style=discord.ButtonStyle.secondary, row=3)
     async def pause(self, interaction: discord.Interaction, button: discord.ui.Button):
         await self._defender(interaction)
-        data = load_data()
-        g = ensure_guild(data, interaction.guild_id)
-        if not g.get("active"):
-            await self._safe_reply(interaction, "⚠️ No hay censo activo.")
-            return
-        g["paused"] = True
-        save_data(data)
+        async with guild_locks.hold(interaction.guild_id, "pausa"):  # NUEVO
+            data = load_data()
+            g = ensure_guild(data, interaction.guild_id)
+            if not g.get("active"):
+                await self._safe_reply(interaction, "⚠️ No hay censo activo.")
+                return
+            g["paused"] = True
+            save_config(interaction.guild_id)
+            reminders.unschedule_guild(interaction.guild_id)  # NUEVO
         await self._safe_reply(interaction, "⏸️ Censo pausado.")
-        if interaction.guild:
-            await refresh_panel_message(self.bot, interaction.guild.id)  # FIX
         await self._refresh(interaction)
 
     @discord.ui.button(label="▶️ Reanudar", style=discord.ButtonStyle.primary, row=3)
     async def resume(self, interaction: discord.Interaction, button: discord.ui.Button):
         await self._defender(interaction)
-        data = load_data()
-        g = ensure_guild(data, interaction.guild_id)
-        if not g.get("active"):
-            await self._safe_reply(interaction, "⚠️ No hay censo activo.")
-            return
-        g["paused"] = False
-        save_data(data)
+        async with guild_locks.hold(interaction.guild_id, "reanudar"):  # NUEVO
+            data = load_data()
+            g = ensure_guild(data, interaction.guild_id)
+            if not g.get("active"):
+                await self._safe_reply(interaction, "⚠️ No hay censo activo.")
+                return
+            g["paused"] = False
+            save_config(interaction.guild_id)
+            reminders.schedule_guild(interaction.guild_id, g)  # NUEVO
         await self._safe_reply(interaction, "▶️ Censo reanudado.")
-        if interaction.guild:
-            await refresh_panel_message(self.bot, interaction.guild.id)  # NUEVO
         await self._refresh(interaction)
 
     @discord.ui.button(label="⏳ Extender +3 días", style=discord.ButtonStyle.secondary, row=3)
     async def extend_3d(self, interaction: discord.Interaction, button: discord.ui.Button):
         await self._defender(interaction)
-        data = load_data()
-        g = ensure_guild(data, interaction.guild_id)
-        if not g.get("active") or not g.get("deadline_utc"):
-            await self._safe_reply(interaction, "⚠️ No hay censo activo con deadline.")
-            return
-        try:
-            dl = datetime.fromisoformat(g["deadline_utc"])
-        except Exception:
-            dl = now_utc()
-        if dl.tzinfo is None:  # NUEVO
-            dl = dl.replace(tzinfo=UTC)  # NUEVO
-        dl = dl + timedelta(days=3)
-        g["deadline_utc"] = dl.isoformat()
-        save_data(data)
+        async with guild_locks.hold(interaction.guild_id, "extender"):  # NUEVO
+            data = load_data()
+            g = ensure_guild(data, interaction.guild_id)
+            if not g.get("active") or not g.get("deadline_utc"):
+                await self._safe_reply(interaction, "⚠️ No hay censo activo con deadline.")
+                return
+            try:
+                dl = datetime.fromisoformat(g["deadline_utc"])
+            except Exception:
+                dl = now_utc()
+            if dl.tzinfo is None:  # NUEVO
+                dl = dl.replace(tzinfo=UTC)  # NUEVO
+            dl = dl + timedelta(days=3)
+            g["deadline_utc"] = dl.isoformat()
+            save_config(interaction.guild_id)
+            reminders.schedule_guild(interaction.guild_id, g)  # NUEVO: recordatorios que caían fuera del deadline
         await self._safe_reply(interaction, "⏳ Deadline extendido +3 días.")
-        if interaction.guild:
-            await refresh_panel_message(self.bot, interaction.guild.id)  # NUEVO
         await self._refresh(interaction)
 
     @discord.ui.button(label="📨 Reenviar a pendientes", style=discord.ButtonStyle.primary, row=3)
     async def resend_pending(self, interaction: discord.Interaction, button: discord.ui.Button):
         await self._defender(interaction)
-        sent = await send_to_pending(self.bot, interaction.guild_id, force=True)
-        await self._safe_reply(interaction, f"📨 Envíos disparados ahora: {sent}")
-        if interaction.guild:
-            await refresh_panel_message(self.bot, interaction.guild.id)  # NUEVO
+        # NUEVO: solo encola (la cola dedup por intento); el envío corre en segundo plano
+        queued = await send_to_pending(self.bot, interaction.guild_id)
+        await self._safe_reply(interaction, f"📨 DMs en cola: {queued} (progreso en el panel).")
         await self._refresh(interaction)
 
     @discord.ui.button(label="🛑 Cerrar censo", style=discord.ButtonStyle.danger, row=4)
     async def stop(self, interaction: discord.Interaction, button: discord.ui.Button):
         await self._defender(interaction)
-        data = load_data()
-        g = ensure_guild(data, interaction.guild_id)
-        g["active"] = False
-        g["paused"] = False
-        g["busy"] = False  # NUEVO
-        save_data(data)
+        async with guild_locks.hold(interaction.guild_id, "cierre"):  # NUEVO
+            data = load_data()
+            g = ensure_guild(data, interaction.guild_id)
+            g["active"] = False
+            g["paused"] = False
+            save_config(interaction.guild_id)
+            reminders.unschedule_guild(interaction.guild_id)  # NUEVO
+            finalize_censo_stats(interaction.guild_id, g, "cerrado")  # NUEVO
         await self._safe_reply(interaction, "🛑 Censo cerrado.")
-        if interaction.guild:
-            await refresh_panel_message(self.bot, interaction.guild.id)  # NUEVO
         await self._refresh(interaction)
 
 # =========================
@@ -419,11 +1478,9 @@ def build_status_embed(guild_id: int) -> discord.Embed:
     data = load_data()
     g = ensure_guild(data, guild_id)
 
-    users = g.get("users", {}) if g.get("active") else {}  # FIX
-    counts = {"YES": 0, "NO": 0, "PENDING": 0, "DM_FAILED": 0, "EXPIRED": 0}
-    for u in users.values():
-        st = u.get("status", "PENDING")
-        counts[st] = counts.get(st, 0) + 1
+    counts = {"YES": 0, "NO": 0, "PENDING": 0, "DM_FAILED": 0, "EXPIRED": 0, "REMOVED": 0}
+    if g.get("active"):  # FIX
+        counts.update(status_index(guild_id, g).counts())  # NUEVO: O(1), sin recorrer users
 
     e = discord.Embed(title="OGT | Panel Censo de Actividad", color=discord.Color.blurple())
     e.add_field(name="Activo", value=str(bool(g.get("active"))), inline=True)
@@ -438,6 +1495,53 @@ def build_status_embed(guild_id: int) -> discord.Embed:
     e.add_field(name="⏳ Pendiente", value=str(counts["PENDING"]), inline=True)
     e.add_field(name="🚫 DM fallido", value=str(counts["DM_FAILED"]), inline=True)
     e.add_field(name="⌛ Vencido", value=str(counts["EXPIRED"]), inline=True)
+    if counts["REMOVED"]:  # NUEVO: roster dinámico
+        e.add_field(name="🚪 Retirado", value=str(counts["REMOVED"]), inline=True)
+
+    # NUEVO: quién tiene el lock del guild y desde cuándo
+    holder = guild_locks.holder(guild_id)
+    if holder:
+        e.add_field(name="🔒 Ocupado por", value=f"{holder[0]} (desde <t:{int(holder[1].timestamp())}:R>)", inline=False)
+
+    # NUEVO: progreso del envío de DMs
+    progress = DISPATCH_PROGRESS.get(guild_id)
+    if progress:
+        done = progress["sent"] + progress["failed"] + progress["errors"]
+        state = "en curso" if progress["running"] else "terminado"
+        e.add_field(
+            name=f"📨 Envío de DMs ({state})",
+            value=f"{done}/{progress['total']} · enviados {progress['sent']} · DM cerrado {progress['failed']} · errores {progress['errors']}",
+            inline=False
+        )
+
+    # NUEVO: progreso de la asignación del rol pendiente
+    progress = ROLE_PROGRESS.get(guild_id)
+    if progress:
+        done = progress["sent"] + progress["failed"] + progress["errors"]
+        state = "en curso" if progress["running"] else "terminado"
+        e.add_field(
+            name=f"🎭 Rol pendiente ({state})",
+            value=f"{done}/{progress['total']} · asignados {progress['sent']} · errores {progress['errors']}",
+            inline=False
+        )
+
+    # NUEVO: profundidad de los carriles de la cola de acciones
+    depths = {lane: n for lane, n in jobs.lane_depths().items() if n}
+    if depths:
+        e.add_field(name="🚦 Colas", value=" · ".join(f"{lane} {n}" for lane, n in depths.items()), inline=False)
+
+    # NUEVO: objetivos que no se pudieron resolver (ni caché ni query_members)
+    unresolved = members.unresolved_count(guild_id)
+    if unresolved and g.get("active"):
+        e.add_field(name="👤 Sin resolver", value=f"{unresolved} miembro(s) del censo (se reintenta)", inline=False)
+
+    # NUEVO: latencia del ack de los botones del DM (todas las guilds de este proceso)
+    if ACK_LATENCY.samples:
+        e.add_field(
+            name="⚡ Ack de respuestas",
+            value=f"p50 {ACK_LATENCY.percentile(50) * 1000:.0f} ms · p99 {ACK_LATENCY.percentile(99) * 1000:.0f} ms · n={len(ACK_LATENCY.samples)}",
+            inline=False
+        )
 
     # NUEVO: Últimas respuestas (solo si está activo)
     lines = []
@@ -466,33 +1570,87 @@ def build_status_embed(guild_id: int) -> discord.Embed:
 # =========================
 # Refresh panel message (edita el panel guardado)
 # =========================
-async def refresh_panel_message(bot: commands.Bot, guild_id: int):  # NUEVO
-    data = load_data()
-    g = ensure_guild(data, guild_id)
+# NUEVO: como máximo una edición por guild cada PANEL_INTERVAL segundos; las
+# peticiones en ráfaga se juntan y si el embed no cambió no se edita.
+PANEL_INTERVAL = float(os.getenv("CENSO_PANEL_INTERVAL", "5"))
 
-    ch_id = g.get("panel_channel_id")
-    msg_id = g.get("panel_message_id")
-    if not ch_id or not msg_id:
-        return
+class PanelRenderer:  # NUEVO
+    def __init__(self, bot: commands.Bot, guild_id: int):
+        self.bot = bot
+        self.guild_id = guild_id
+        self.message: discord.PartialMessage | None = None  # sin fetch_message
+        self.view: CensoPanelView | None = None             # una sola view por panel
+        self.last_render: dict | None = None
+        self.last_edit = 0.0
+        self.dirty = False
+        self._task: asyncio.Task | None = None
+
+    def _handle(self) -> discord.PartialMessage | None:
+        g = ensure_guild(load_data(), self.guild_id)
+        ch_id = g.get("panel_channel_id")
+        msg_id = g.get("panel_message_id")
+        if not ch_id or not msg_id:
+            self.message = None
+            return None
+        if self.message is None or self.message.id != int(msg_id) or self.message.channel.id != int(ch_id):
+            guild = self.bot.get_guild(self.guild_id)
+            channel = guild.get_channel(int(ch_id)) if guild else None
+            if not channel:
+                return None
+            self.message = channel.get_partial_message(int(msg_id))
+            self.last_render = None
+        return self.message
+
+    def request(self):
+        self.dirty = True
+        if self._task is None or self._task.done():
+            self._task = spawn(self._run())
+
+    async def _run(self):
+        while self.dirty:
+            wait = self.last_edit + PANEL_INTERVAL - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self.dirty = False
+            await self.render()
+
+    async def render(self, force: bool = False) -> bool:
+        msg = self._handle()
+        if msg is None:
+            return False
+        embed = build_status_embed(self.guild_id)
+        rendered = embed.to_dict()
+        if not force and rendered == self.last_render:
+            return True
+        if self.view is None:
+            self.view = CensoPanelView(self.bot)
+        try:
+            await outbound_bucket.acquire(PRIORITY_UPDATE)  # NUEVO: antes que la ola de DMs
+            await msg.edit(embed=embed, view=self.view)
+        except discord.NotFound:
+            self.message = None  # borraron el panel
+            return False
+        except Exception as e:
+            print("⚠️ No pude editar el panel:", repr(e))
+            return False
+        self.last_render = rendered
+        self.last_edit = time.monotonic()
+        metrics.inc("censo_panel_edits_total", guild=self.guild_id)  # NUEVO
+        return True
 
-    guild = bot.get_guild(guild_id)
-    if not guild:
-        return
+PANELS: dict[int, PanelRenderer] = {}
 
-    channel = guild.get_channel(int(ch_id))
-    if not channel:
-        return
+def panel_renderer(bot: commands.Bot, guild_id: int) -> PanelRenderer:
+    r = PANELS.get(guild_id)
+    if r is None:
+        r = PANELS[guild_id] = PanelRenderer(bot, guild_id)
+    return r
 
-    try:
-        msg = await channel.fetch_message(int(msg_id))
-    except Exception:
+async def refresh_panel_message(bot: commands.Bot, guild_id: int):  # NUEVO
+    # NUEVO: no edita en el acto; pide un refresco coalescido
+    if bot is None:
         return
-
-    embed = build_status_embed(guild_id)
-    try:
-        await msg.edit(embed=embed, view=CensoPanelView(bot))
-    except Exception:
-        pass
+    panel_renderer(bot, guild_id).request()
 
 # =========================
 # parse dt utc
@@ -509,23 +1667,854 @@ def parse_dt_utc(dt_iso: str | None) -> datetime:  # FIX
         return dt.replace(tzinfo=UTC)  # FIX
     return dt.astimezone(UTC)  # FIX
 
+# =========================
+# Dispatcher de DMs (token bucket + envíos concurrentes)
+# =========================
+# NUEVO: ritmo objetivo de DMs. discord.py ya respeta los buckets por ruta y el
+# límite global (50 req/s); aquí solo fijamos cuánto de ese presupuesto usan los DMs
+# y frenamos todo el bucket cuando Discord devuelve un 429.
+DM_RATE = float(os.getenv("CENSO_DM_RATE", "4"))               # DMs por segundo
+DM_BURST = int(os.getenv("CENSO_DM_BURST", "5"))                # ráfaga máxima
+DM_CONCURRENCY = int(os.getenv("CENSO_DM_CONCURRENCY", "4"))    # envíos en vuelo
+
+class TokenBucket:  # NUEVO
+    def __init__(self, rate: float, burst: int):
+        self.rate = max(rate, 0.01)
+        self.capacity = max(burst, 1)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = asyncio.Lock()  # los que esperan salen en orden de llegada
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def penalize(self, retry_after: float):
+        # 429 observado: nadie sale del bucket hasta que pase retry_after
+        now = time.monotonic()
+        self.blocked_until = max(self.blocked_until, now + max(retry_after, 0.0))
+        self.tokens = 0.0
+        self.updated = now
+
+dm_bucket = TokenBucket(DM_RATE, DM_BURST)  # NUEVO
+# NUEVO: presupuesto global del proceso (todas las guilds y tipos de acción);
+# por debajo del límite global de Discord (50 req/s)
+OUTBOUND_RATE = float(os.getenv("CENSO_OUTBOUND_RATE", "40"))
+
+# NUEVO: prioridades del presupuesto global (menor = antes)
+PRIORITY_INTERACTION = 0  # acks y follow-ups: nunca esperan, solo descuentan
+PRIORITY_ANSWER = 1       # roles de quien respondió
+PRIORITY_UPDATE = 2       # panel y log
+PRIORITY_BULK = 3         # olas de DMs y rol pendiente
+
+class PriorityBucket(TokenBucket):  # NUEVO
+    # El siguiente token va al que espera con mayor prioridad: una ola de DMs
+    # cede el paso a los roles de una respuesta o a una edición del panel.
+    def __init__(self, rate: float, burst: int):
+        super().__init__(rate, burst)
+        self._waiters: list = []  # heap (prioridad, orden, future)
+        self._order = itertools.count()
+        self._granter: asyncio.Task | None = None
+
+    def waiting(self) -> dict[int, int]:
+        counts: dict[int, int] = {}
+        for priority, _, fut in self._waiters:
+            if not fut.done():
+                counts[priority] = counts.get(priority, 0) + 1
+        return counts
+
+    async def acquire(self, priority: int = PRIORITY_BULK):
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._order), fut))
+        if self._granter is None or self._granter.done():
+            self._granter = asyncio.create_task(self._grant())
+        await fut
+
+    def charge(self, n: float = 1.0):
+        # tráfico que no puede esperar (interacciones): descuenta y el resto se frena
+        self._refill(time.monotonic())
+        self.tokens -= n
+
+    async def _grant(self):
+        while self._waiters:
+            now = time.monotonic()
+            if now < self.blocked_until:
+                await asyncio.sleep(self.blocked_until - now)
+                continue
+            self._refill(now)
+            if self.tokens >= 1:
+                _, _, fut = heapq.heappop(self._waiters)
+                if not fut.done():  # cancelado mientras esperaba
+                    self.tokens -= 1
+                    fut.set_result(None)
+                continue
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+outbound_bucket = PriorityBucket(OUTBOUND_RATE, max(1, int(OUTBOUND_RATE)))
+
+# NUEVO: progreso por guild (lo muestra el panel): DMs y rol pendiente
+DISPATCH_PROGRESS: dict[int, dict] = {}
+ROLE_PROGRESS: dict[int, dict] = {}
+JOB_PROGRESS = {"dm": DISPATCH_PROGRESS, "role_pending": ROLE_PROGRESS}
+
+def _retry_after(exc: Exception) -> float:
+    try:
+        return float(exc.response.headers.get("Retry-After", 1.0))
+    except Exception:
+        return 1.0
+
+async def _on_http_request_end(session, ctx, params):
+    # NUEVO: cualquier 429 (aunque discord.py lo reintente solo) frena los DMs
+    if params.response.status == 429:
+        try:
+            retry_after = float(params.response.headers.get("Retry-After", 1.0))
+        except Exception:
+            retry_after = 1.0
+        dm_bucket.penalize(retry_after)
+        if params.response.headers.get("X-RateLimit-Global") or params.response.headers.get("X-RateLimit-Scope") == "global":
+            outbound_bucket.penalize(retry_after)  # NUEVO: 429 global frena a todas las guilds
+        metrics.inc("censo_http_429_total", scope=params.response.headers.get("X-RateLimit-Scope", "user"))  # NUEVO
+        metrics.inc("censo_http_retry_after_seconds_total", retry_after)  # NUEVO
+
+http_trace = aiohttp.TraceConfig()  # NUEVO
+http_trace.on_request_end.append(_on_http_request_end)
+
+_background_tasks: set[asyncio.Task] = set()
+
+def spawn(coro) -> asyncio.Task:
+    # NUEVO: tarea en segundo plano con referencia fuerte (evita que el GC la corte)
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+# =========================
+# Cola persistente de acciones salientes (DMs, roles, logs)
+# =========================
+# NUEVO: cada acción hacia Discord se anota en un JSONL append-only con una
+# clave de idempotencia. Tras un reinicio se reanudan las pendientes y las ya
+# hechas no se repiten.
+JOBS_FILE = os.getenv("CENSO_JOBS_FILE", "censo_jobs.jsonl")
+ROLE_WORKERS = int(os.getenv("CENSO_ROLE_WORKERS", "2"))
+JOB_MAX_ATTEMPTS = int(os.getenv("CENSO_JOB_MAX_ATTEMPTS", "5"))
+JOB_RETENTION_DAYS = int(os.getenv("CENSO_JOB_RETENTION_DAYS", "14"))
+ROLE_RATE = float(os.getenv("CENSO_ROLE_RATE", "1"))  # cambios de rol por segundo
+
+# FIX: por prioridad (como el presupuesto global): los roles de una respuesta no
+# esperan detrás de una ola de rol pendiente
+role_bucket = PriorityBucket(ROLE_RATE, 2)  # NUEVO
+
+class FairQueue:  # NUEVO
+    # Cola de un carril con una sub-cola por guild y reparto round-robin: una
+    # guild con 50k DMs en cola no retrasa los 10 de una guild chica.
+    def __init__(self):
+        self.groups: dict[int, collections.deque] = {}
+        self.ring: collections.deque = collections.deque()  # guilds con trabajo, en turno
+        self.depth = 0
+        self._ready = asyncio.Event()
+
+    def put_nowait(self, key: str, group: int):
+        q = self.groups.get(group)
+        if q is None:
+            q = self.groups[group] = collections.deque()
+            self.ring.append(group)
+        q.append(key)
+        self.depth += 1
+        self._ready.set()
+
+    def qsize(self) -> int:
+        return self.depth
+
+    def get_nowait(self) -> str | None:
+        if not self.ring:
+            return None
+        group = self.ring.popleft()
+        q = self.groups[group]
+        key = q.popleft()
+        self.depth -= 1
+        if q:
+            self.ring.append(group)  # vuelve al final de la ronda
+        else:
+            del self.groups[group]
+        return key
+
+    async def get(self) -> str:
+        while True:
+            key = self.get_nowait()
+            if key is not None:
+                return key
+            self._ready.clear()
+            await self._ready.wait()
+
+class JobQueue:  # NUEVO
+    # Estados: queued -> running -> done | failed (con reintentos y backoff)
+    # held: persistido pero sin despachar (líneas del digest del log hasta que se agrupan)
+    def __init__(self, path: str = JOBS_FILE):
+        self.path = path
+        self.jobs: dict[str, dict] = {}
+        self._ready: dict[str, FairQueue] = {}  # una cola por carril (ver JOB_LANES), justa entre guilds
+        self._workers: list[asyncio.Task] = []
+        self._fh = None
+        self.bot: commands.Bot | None = None
+        # FIX: el append al archivo no corre en el loop; las líneas se juntan y un hilo
+        # propio las escribe en lote, en orden (como el writer de CensoStore)
+        self._pending: list[str] = []
+        self._flusher: asyncio.Task | None = None
+        self._io = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="censo-jobs")
+
+    def _append(self, *records: dict):
+        # se serializa aquí: los dicts de los jobs siguen cambiando después
+        self._pending.append("".join(json.dumps(r, ensure_ascii=False, separators=(",", ":")) + "\n" for r in records))
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._write_lines(self._take_pending())  # sin loop (scripts, arranque): directo
+            return
+        if self._flusher is None or self._flusher.done():
+            self._flusher = loop.create_task(self._flush_pending())
+
+    def _take_pending(self) -> list[str]:
+        lines, self._pending = self._pending, []
+        return lines
+
+    def _write_lines(self, lines: list[str]):
+        if not lines:
+            return
+        if self._fh is None:
+            _ensure_folder(self.path)
+            self._fh = open(self.path, "a", encoding="utf-8")
+        self._fh.write("".join(lines))
+        self._fh.flush()
+
+    async def _flush_pending(self):
+        loop = asyncio.get_running_loop()
+        while self._pending:
+            lines = self._take_pending()
+            try:
+                await loop.run_in_executor(self._io, self._write_lines, lines)
+            except Exception as e:
+                print("❌ No pude escribir la cola de acciones:", repr(e))
+                self._pending[:0] = lines  # se reintenta con el próximo append o al cerrar
+                return
+
+    def load(self):
+        self.jobs = {}
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except Exception:
+                        continue  # línea cortada por un crash
+                    self.jobs.setdefault(rec["key"], {}).update(rec)
+
+        # compactar: solo el último estado de cada job, sin terminados viejos
+        cutoff = (now_utc() - timedelta(days=JOB_RETENTION_DAYS)).isoformat()
+        self.jobs = {
+            k: j for k, j in self.jobs.items()
+            if "kind" in j and (j.get("state") not in ("done", "failed") or j.get("ts", "") >= cutoff)
+        }
+        for j in self.jobs.values():
+            if j.get("state") == "running":
+                j["state"] = "queued"  # quedó a medias: se reintenta (el handler es idempotente)
+        tmp = self.path + ".tmp"
+        _ensure_folder(self.path)
+        with open(tmp, "w", encoding="utf-8") as f:
+            for j in self.jobs.values():
+                f.write(json.dumps(j, ensure_ascii=False, separators=(",", ":")) + "\n")
+        os.replace(tmp, self.path)
+
+    def _set_state(self, job: dict, state: str, **extra):
+        job["state"] = state
+        job["ts"] = now_utc().isoformat()
+        job.update(extra)
+        self._append({"key": job["key"], "state": state, "ts": job["ts"], "attempts": job.get("attempts", 0), **extra})
+
+    def _new_job(self, kind: str, key: str, guild_id: int, payload: dict) -> dict | None:
+        # None si la clave ya existe (ya encolado o ya hecho)
+        old = self.jobs.get(key)
+        if old is not None and not (old["state"] == "failed" or old.get("result") == "SKIPPED"):
+            return None
+        job = {
+            "key": key, "kind": kind, "guild_id": int(guild_id), "payload": payload,
+            "state": "queued", "attempts": 0, "ts": now_utc().isoformat(),
+        }
+        self.jobs[key] = job
+        return job
+
+    def _dispatch(self, job: dict):
+        _job_progress(job, "queued")
+        if self._ready:
+            self._ready[JOB_HANDLERS[job["kind"]][2]].put_nowait(job["key"], job["guild_id"])
+
+    def enqueue(self, kind: str, key: str, guild_id: int, payload: dict) -> bool:
+        job = self._new_job(kind, key, guild_id, payload)
+        if job is None:
+            return False
+        self._append(job)
+        self._dispatch(job)
+        return True
+
+    def enqueue_many(self, items: list[tuple[str, str, int, dict]]) -> int:
+        # NUEVO: lote (kind, key, guild_id, payload) con una sola escritura al archivo
+        new = [j for j in (self._new_job(*item) for item in items) if j is not None]
+        if new:
+            self._append(*new)
+            for job in new:
+                self._dispatch(job)
+        return len(new)
+
+    def hold(self, kind: str, key: str, guild_id: int, payload: dict) -> dict | None:
+        # NUEVO: queda en disco (sobrevive a un reinicio) pero no entra a ningún carril
+        job = self._new_job(kind, key, guild_id, payload)
+        if job is None:
+            return None
+        job["state"] = "held"
+        self._append(job)
+        return job
+
+    def held(self, kind: str) -> list[dict]:
+        return [j for j in self.jobs.values() if j["kind"] == kind and j["state"] == "held"]
+
+    def merge(self, held: list[dict], items: list[tuple[str, str, int, dict]]) -> int:
+        # NUEVO: los retenidos pasan a done y los agrupados entran a la cola en la misma escritura
+        now = now_utc().isoformat()
+        done = []
+        for job in held:
+            if self.jobs.get(job["key"]) is job and job["state"] == "held":
+                job.update(state="done", result="MERGED", ts=now)
+                done.append({"key": job["key"], "state": "done", "ts": now, "attempts": 0, "result": "MERGED"})
+        new = [j for j in (self._new_job(*item) for item in items) if j is not None]
+        if done or new:
+            self._append(*new, *done)
+        for job in new:
+            self._dispatch(job)
+        return len(new)
+
+    def lane_depths(self) -> dict[str, int]:
+        # NUEVO: trabajos listos por carril (sin contar los que esperan reintento)
+        return {lane: q.qsize() for lane, q in self._ready.items()}
+
+    async def _retry_later(self, key: str, delay: float):
+        await asyncio.sleep(delay)
+        job = self.jobs.get(key)
+        if job is not None:
+            self._ready[JOB_HANDLERS[job["kind"]][2]].put_nowait(key, job["guild_id"])
+
+    async def _worker(self, lane: str):
+        ready = self._ready[lane]
+        while True:
+            key = await ready.get()
+            job = self.jobs.get(key)
+            if job is None or job.get("state") != "queued":
+                continue
+            handler, bucket, _lane = JOB_HANDLERS[job["kind"]]
+            if job["kind"] not in PER_CALL_KINDS:  # FIX: esos cobran en el handler, por llamada
+                if bucket is not None:
+                    await bucket.acquire()
+                await outbound_bucket.acquire(LANE_PRIORITY[lane])  # NUEVO: presupuesto global, por prioridad
+            self._set_state(job, "running", attempts=job.get("attempts", 0) + 1)
+            try:
+                result = await handler(self.bot, job)
+            except Exception as e:
+                if isinstance(e, discord.HTTPException) and e.status == 429 and bucket is not None:
+                    bucket.penalize(_retry_after(e))
+                    metrics.inc("censo_http_429_total", scope="job")  # NUEVO
+                    metrics.inc("censo_http_retry_after_seconds_total", _retry_after(e))  # NUEVO
+                # sin permisos / ya no existe: reintentar no sirve
+                if isinstance(e, (discord.Forbidden, discord.NotFound)) or job["attempts"] >= JOB_MAX_ATTEMPTS:
+                    self._set_state(job, "failed", error=repr(e)[:200])
+                    _job_progress(job, "ERROR")
+                else:
+                    self._set_state(job, "queued", error=repr(e)[:200])
+                    spawn(self._retry_later(key, min(60.0, 2.0 ** job["attempts"])))
+                continue
+            self._set_state(job, "done", result=result)
+            _job_progress(job, result)
+
+    def start(self, bot: commands.Bot):
+        self.bot = bot
+        if self._workers:
+            return
+        self.load()
+        self._ready = {lane: FairQueue() for lane in JOB_LANES}
+        for job in self.jobs.values():
+            if job["state"] == "queued":
+                self._dispatch(job)
+        # NUEVO: carriles con workers propios: los roles nunca frenan a los DMs
+        self._workers = [
+            asyncio.create_task(self._worker(lane))
+            for lane, workers in JOB_LANES.items()
+            for _ in range(max(1, workers))
+        ]
+
+    async def close(self):
+        for t in self._workers:
+            t.cancel()
+        for t in self._workers:
+            try:
+                await t
+            except (asyncio.CancelledError, Exception):
+                pass
+        self._workers = []
+        if self._flusher is not None:
+            await self._flusher  # lo que ya estaba en el hilo
+            self._flusher = None
+        self._write_lines(self._take_pending())
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+jobs = JobQueue()  # NUEVO
+
+def _job_progress(job: dict, result: str):
+    # progreso por guild de los DMs y de la asignación del rol pendiente (panel)
+    progress_by_guild = JOB_PROGRESS.get(job["kind"])
+    if progress_by_guild is None:
+        return
+    gid = job["guild_id"]
+    progress = progress_by_guild.get(gid)
+    if progress is None or not progress["running"]:
+        progress = {"running": True, "total": 0, "sent": 0, "failed": 0, "errors": 0, "started": now_utc()}
+        progress_by_guild[gid] = progress
+    if result == "queued":
+        progress["total"] += 1
+        return
+    key = {"SENT": "sent", "FAILED": "failed", "ERROR": "errors"}.get(result)
+    if result == "ERROR" and job["kind"] == "dm":
+        reminders.retry_later(gid, job["payload"]["user_id"])  # el DM se reintenta más tarde
+    if key:
+        progress[key] += 1
+        if job["kind"] == "dm":
+            metrics.inc("censo_dm_total", guild=gid, result={"errors": "error"}.get(key, key))  # NUEVO
+    else:
+        progress["total"] -= 1  # SKIPPED: ya no hacía falta
+    if progress["sent"] + progress["failed"] + progress["errors"] >= progress["total"]:
+        progress["running"] = False
+        progress["finished"] = now_utc()
+    if jobs.bot is not None:
+        panel_renderer(jobs.bot, gid).request()  # coalescido: a lo sumo 1 edición por intervalo
+
+# =========================
+# Resolución de miembros (caché LRU + consultas en lote)
+# =========================
+# NUEVO: al iniciar un censo se pide el roster completo una vez (chunk); lo que
+# no está en la caché de discord.py se busca en una LRU con TTL y, si tampoco,
+# se junta en lotes de query_members (hasta 100 ids por pedido al gateway) en
+# vez de un fetch_member REST por usuario.
+MEMBER_CACHE_SIZE = int(os.getenv("CENSO_MEMBER_CACHE", "20000"))
+MEMBER_TTL = float(os.getenv("CENSO_MEMBER_TTL", "900"))
+MEMBER_BATCH_DELAY = float(os.getenv("CENSO_MEMBER_BATCH_DELAY", "0.2"))  # ventana para juntar fallos
+MEMBER_QUERY_MAX = 100  # límite de user_ids por query_members
+
+metrics.describe("censo_member_cache_total", "counter", "Resoluciones de miembros por origen (gateway, lru, query, miss).")
+metrics.describe("censo_member_queries_total", "counter", "Consultas query_members al gateway (hasta 100 ids cada una).")
+metrics.describe("censo_members_unresolved", "gauge", "Objetivos del censo que no se pudieron resolver.")
+
+class MemberResolver:  # NUEVO
+    def __init__(self):
+        self.cache: collections.OrderedDict[tuple[int, int], tuple[discord.Member, float]] = collections.OrderedDict()
+        self.unresolved: dict[int, set[str]] = {}
+        self._pending: dict[int, dict[int, list[asyncio.Future]]] = {}
+        self._flushers: dict[int, asyncio.Task] = {}
+
+    def remember(self, member: discord.Member):
+        key = (member.guild.id, member.id)
+        self.cache[key] = (member, time.monotonic() + MEMBER_TTL)
+        self.cache.move_to_end(key)
+        while len(self.cache) > MEMBER_CACHE_SIZE:
+            self.cache.popitem(last=False)
+        missing = self.unresolved.get(member.guild.id)
+        if missing and str(member.id) in missing:
+            missing.discard(str(member.id))
+            metrics.set("censo_members_unresolved", len(missing), guild=member.guild.id)
+
+    def forget(self, guild_id: int, user_id: int):
+        self.cache.pop((guild_id, int(user_id)), None)
+
+    def reset(self, guild_id: int):
+        # nuevo censo: se vuelve a contar quién no se pudo resolver
+        self.unresolved.pop(guild_id, None)
+        metrics.set("censo_members_unresolved", 0, guild=guild_id)
+
+    def get(self, guild: discord.Guild, user_id) -> discord.Member | None:
+        uid = int(user_id)
+        member = guild.get_member(uid)
+        if member is not None:
+            metrics.inc("censo_member_cache_total", result="gateway")
+            return member
+        hit = self.cache.get((guild.id, uid))
+        if hit is not None:
+            if hit[1] > time.monotonic():
+                self.cache.move_to_end((guild.id, uid))
+                metrics.inc("censo_member_cache_total", result="lru")
+                return hit[0]
+            del self.cache[(guild.id, uid)]
+        return None
+
+    async def resolve(self, guild: discord.Guild, user_id) -> discord.Member | None:
+        member = self.get(guild, user_id)
+        if member is not None:
+            return member
+        fut = asyncio.get_running_loop().create_future()
+        self._pending.setdefault(guild.id, {}).setdefault(int(user_id), []).append(fut)
+        task = self._flushers.get(guild.id)
+        if task is None or task.done():
+            self._flushers[guild.id] = asyncio.create_task(self._flush(guild))
+        return await fut
+
+    async def resolve_many(self, guild: discord.Guild, user_ids: list[str]) -> dict[str, discord.Member]:
+        found = await asyncio.gather(*(self.resolve(guild, uid) for uid in user_ids))
+        return {uid: m for uid, m in zip(user_ids, found) if m is not None}
+
+    async def _flush(self, guild: discord.Guild):
+        await asyncio.sleep(MEMBER_BATCH_DELAY)
+        while self._pending.get(guild.id):
+            pending = self._pending.pop(guild.id)
+            ids = list(pending)
+            found: dict[int, discord.Member] = {}
+            for i in range(0, len(ids), MEMBER_QUERY_MAX):
+                batch = ids[i:i + MEMBER_QUERY_MAX]
+                metrics.inc("censo_member_queries_total")
+                try:
+                    result = await guild.query_members(user_ids=batch, limit=len(batch), cache=True)
+                except Exception as e:  # timeout del gateway, intents...
+                    print("⚠️ query_members falló:", repr(e))
+                    result = []
+                for m in result:
+                    found[m.id] = m
+                    self.remember(m)
+
+            missing = self.unresolved.setdefault(guild.id, set())
+            for uid, futs in pending.items():
+                member = found.get(uid)
+                metrics.inc("censo_member_cache_total", result="query" if member else "miss")
+                if member is None:
+                    missing.add(str(uid))
+                for fut in futs:
+                    if not fut.done():
+                        fut.set_result(member)
+            metrics.set("censo_members_unresolved", len(missing), guild=guild.id)
+
+    async def prefetch(self, guild: discord.Guild):
+        # una sola petición de roster por censo; con la caché completa role.members sirve entero
+        if guild.chunked:
+            return
+        try:
+            await guild.chunk(cache=True)
+        except Exception as e:
+            print("⚠️ No pude pedir el roster completo (chunk):", repr(e))
+
+    def unresolved_count(self, guild_id: int) -> int:
+        return len(self.unresolved.get(guild_id, ()))
+
+members = MemberResolver()  # NUEVO
+
+# =========================
+# Log público: por evento o en resumen (digest)
+# =========================
+# NUEVO: en modo "digest" los eventos por miembro (respuestas, DM cerrado) se
+# juntan por guild y salen como un solo mensaje cada LOG_DIGEST_SECONDS o cada
+# LOG_DIGEST_MAX_EVENTS eventos, partido en trozos de <= 2000 caracteres.
+LOG_MODE = os.getenv("CENSO_LOG_MODE", "digest").strip().lower()  # "digest" | "evento"
+LOG_DIGEST_SECONDS = float(os.getenv("CENSO_LOG_DIGEST_SECONDS", "60"))
+LOG_DIGEST_MAX_EVENTS = int(os.getenv("CENSO_LOG_DIGEST_MAX_EVENTS", "25"))
+DISCORD_MESSAGE_LIMIT = 2000
+
+def log_mode(g: dict) -> str:
+    return g.get("log_mode") or LOG_MODE
+
+def _chunk_lines(lines: list[str], header: str) -> list[str]:
+    chunks = []
+    current = header
+    for line in lines:
+        line = line[:DISCORD_MESSAGE_LIMIT - len(header) - 1]
+        if len(current) + 1 + len(line) > DISCORD_MESSAGE_LIMIT:
+            chunks.append(current)
+            current = header
+        current += "\n" + line
+    if current != header:
+        chunks.append(current)
+    return chunks
+
+class LogDigest:  # NUEVO
+    # Cada línea es un job "log" retenido en la cola persistente: un crash antes del
+    # resumen no la pierde (al arrancar vuelve al digest, ver restore_log_digests).
+    def __init__(self, guild_id: int):
+        self.guild_id = guild_id
+        self.lines: list[dict] = []
+        self._timer: asyncio.Task | None = None
+
+    def add(self, job: dict):
+        self.lines.append(job)
+        if len(self.lines) >= LOG_DIGEST_MAX_EVENTS:
+            self.flush()
+        elif self._timer is None or self._timer.done():
+            self._timer = spawn(self._wait_and_flush())
+
+    async def _wait_and_flush(self):
+        await asyncio.sleep(LOG_DIGEST_SECONDS)
+        self.flush()
+
+    def flush(self):
+        if self._timer is not None and self._timer is not asyncio.current_task():
+            self._timer.cancel()
+        self._timer = None
+        held, self.lines = self.lines, []
+        if not held:
+            return
+        g = ensure_guild(load_data(), self.guild_id)
+        lines = [job["payload"]["content"] for job in held]
+        header = f"🧾 **Censo OGT — {len(lines)} evento(s)** · 🕒 {now_utc().strftime('%Y-%m-%d %H:%M UTC')}"
+        stamp = time.time_ns()
+        channel_id = int(g["log_channel_id"]) if g.get("log_channel_id") else held[-1]["payload"]["channel_id"]
+        jobs.merge(held, [
+            ("log", f"log:digest:{self.guild_id}:{stamp}:{i}", self.guild_id,
+             {"channel_id": channel_id, "content": chunk})
+            for i, chunk in enumerate(_chunk_lines(lines, header))
+        ])
+
+LOG_DIGESTS: dict[int, LogDigest] = {}
+
+def flush_log_digests():
+    for digest in LOG_DIGESTS.values():
+        digest.flush()
+
+def restore_log_digests() -> int:
+    # NUEVO: líneas retenidas antes de un reinicio vuelven a su digest (salen en el próximo resumen)
+    held = sorted(jobs.held("log"), key=lambda j: j["ts"])
+    for job in held:
+        LOG_DIGESTS.setdefault(job["guild_id"], LogDigest(job["guild_id"])).add(job)
+    return len(held)
+
+def enqueue_log(guild_id: int, key: str, content: str, immediate: bool = False) -> bool:
+    g = ensure_guild(load_data(), guild_id)
+    if not g.get("log_channel_id"):
+        return False
+    payload = {"channel_id": int(g["log_channel_id"]), "content": content}
+    if not immediate and log_mode(g) == "digest":
+        job = jobs.hold("log", f"log:{key}", guild_id, payload)  # NUEVO: persistido hasta el resumen
+        if job is None:
+            return False
+        LOG_DIGESTS.setdefault(guild_id, LogDigest(guild_id)).add(job)
+        return True
+    return jobs.enqueue("log", f"log:{key}", guild_id, payload)
+
+async def _job_log(bot: commands.Bot, job: dict) -> str:
+    guild = bot.get_guild(job["guild_id"])
+    channel = guild.get_channel(job["payload"]["channel_id"]) if guild else None
+    if not channel:
+        return "SKIPPED"
+    await channel.send(job["payload"]["content"])
+    return "SENT"
+
+# NUEVO: el id del canal DM se guarda por usuario; con él se envía directo a un
+# PartialMessageable y el create_dm (1 llamada REST extra) solo hace falta la primera
+# vez o si el canal dejó de existir. Tras un reinicio la caché de discord.py está vacía.
+metrics.describe("censo_dm_channel_total", "counter", "Envíos de DM por origen del canal (hit = id guardado o en caché, miss = create_dm).")
+
+async def _send_dm(bot: commands.Bot, member: discord.Member, u: dict, **kwargs) -> int:
+    channel_id = u.get("dm_channel_id")
+    if channel_id:
+        channel = bot.get_partial_messageable(int(channel_id), type=discord.ChannelType.private)
+        try:
+            await channel.send(**kwargs)
+            metrics.inc("censo_dm_channel_total", result="hit")
+            return int(channel_id)
+        except discord.NotFound:
+            pass  # canal inexistente: se abre de nuevo
+
+    channel = member.dm_channel
+    metrics.inc("censo_dm_channel_total", result="hit" if channel else "miss")
+    if channel is None:
+        channel = await member.create_dm()
+    await channel.send(**kwargs)
+    return channel.id
+
+def _dm_target(gid: int, censo_id: str, uid: str) -> tuple[dict, dict | None]:
+    # FIX: relectura después de cada await: pudo responder, cerrarse o empezar otro censo
+    g = ensure_guild(load_data(), gid)
+    u = g["users"].get(uid)
+    if not g.get("active") or g.get("censo_id") != censo_id or u is None or u.get("status") != "PENDING":
+        return g, None
+    return g, u
+
+async def _job_dm(bot: commands.Bot, job: dict) -> str:
+    p = job["payload"]
+    gid = job["guild_id"]
+    uid = p["user_id"]
+    g = ensure_guild(load_data(), gid)
+    u = g["users"].get(uid)
+    # el estado pudo cambiar mientras esperaba turno (respondió, venció, otro censo, pausa)
+    # FIX: en pausa no sale; al reanudar se vuelve a encolar (la clave SKIPPED se reutiliza)
+    if not g.get("active") or g.get("paused") or g.get("censo_id") != p["censo_id"] or u is None or u.get("status") != "PENDING":
+        return "SKIPPED"
+    attempts = int(u.get("attempts", 0))
+    if attempts >= p["attempt"]:
+        return "SKIPPED"  # ya se envió antes del reinicio
+
+    deadline = parse_dt_utc(g.get("deadline_utc"))
+    if now_utc() > deadline:
+        set_user_status(gid, g, uid, "EXPIRED")
+        return "SKIPPED"
+
+    guild = bot.get_guild(gid)
+    member = await members.resolve(guild, uid) if guild else None
+    if not member:
+        reminders.retry_later(gid, uid)  # NUEVO: se reintenta como antes hacía el tick
+        return "SKIPPED"
+    g, u = _dm_target(gid, p["censo_id"], uid)
+    if u is None or g.get("paused"):
+        return "SKIPPED"
+
+    deadline_ts = int(deadline.timestamp())
+    dl_text = deadline.strftime("%Y-%m-%d %H:%M UTC")
+    if attempts == 0:
+        content = (
+            "👋 **Soldado de OGT**, \n\n"
+            "Estamos realizando una **actualización de actividad** del clan en *Hell Let Loose*.\n\n"
+            "👉 ¿Vas a **seguir activo** con OGT?\n\n"
+            f"⏰ **Fecha límite:** <t:{deadline_ts}:F>\n"
+            f"⌛ **Tiempo restante:** <t:{deadline_ts}:R>\n\n"
+            "✅ Si respondes **Sí**, mantienes tu rol.\n"
+            "❌ Si respondes **No**, pasarás a **Antiguo miembro OGT**.\n\n"
+            "— Staff OGT"
+        )
+    else:
+        content = (
+            "⏰ **Recordatorio OGT**\n\n"
+            "Aún no hemos recibido tu respuesta al censo de actividad.\n"
+            f"Por favor confirma antes del **{dl_text}** usando los botones.\n\n"
+            "— Staff OGT"
+        )
+
+    view = censo_dm_view(gid, p["censo_id"], int(uid))  # NUEVO: botones dinámicos
+    try:
+        channel_id = await _send_dm(bot, member, u, content=content, view=view)
+    except discord.Forbidden:
+        g, u = _dm_target(gid, p["censo_id"], uid)
+        if u is None:
+            return "FAILED"  # ya respondió o cambió el censo: no se toca su estado
+        set_user_status(gid, g, uid, "DM_FAILED", attempts=attempts + 1, last_sent_utc=now_utc().isoformat())
+        enqueue_log(
+            gid, f"{p['censo_id']}:dm_failed:{uid}",
+            f"🚫 {member.mention} — No fue posible enviar DM (mensajes privados cerrados). "
+            f"📌 Debe confirmar con el staff antes del deadline."
+        )
+        return "FAILED"
+
+    g, u = _dm_target(gid, p["censo_id"], uid)
+    if u is None:
+        return "SENT"  # respondió mientras salía el recordatorio: su respuesta manda
+    set_user_status(gid, g, uid, "PENDING", attempts=attempts + 1, last_sent_utc=now_utc().isoformat(), dm_channel_id=channel_id)
+    return "SENT"
+
+async def _role_call(lane: str):
+    # FIX: un token de roles y uno global por cada llamada REST de roles (una respuesta
+    # NO puede hacer hasta 3), con la prioridad de su carril
+    priority = LANE_PRIORITY[lane]
+    await role_bucket.acquire(priority)
+    await outbound_bucket.acquire(priority)
+
+def _awaiting_answer(gid: int, censo_id: str, uid: str) -> bool:
+    # FIX: el rol pendiente solo tiene sentido mientras ese censo sigue abierto y sin respuesta
+    g = ensure_guild(load_data(), gid)
+    u = g["users"].get(uid)
+    return bool(g.get("active")) and g.get("censo_id") == censo_id and u is not None and u.get("status") in ("PENDING", "DM_FAILED")
+
+async def _job_role_pending(bot: commands.Bot, job: dict) -> str:
+    p = job["payload"]
+    gid, uid = job["guild_id"], p["user_id"]
+    censo_id = p.get("censo_id") or job["key"].split(":")[1]  # jobs encolados antes de llevarlo en el payload
+    if not _awaiting_answer(gid, censo_id, uid):
+        return "SKIPPED"
+    guild = bot.get_guild(gid)
+    rp = guild.get_role(p["role_id"]) if guild else None
+    member = await members.resolve(guild, uid) if guild else None
+    if not rp or not member or rp in member.roles:
+        return "SKIPPED"
+    await _role_call("roles")  # a CENSO_ROLE_RATE esto puede tardar: se vuelve a mirar
+    if not _awaiting_answer(gid, censo_id, uid):
+        return "SKIPPED"
+    await member.add_roles(rp, reason="Censo OGT: pendiente de confirmar")
+    if not _awaiting_answer(gid, censo_id, uid):
+        # respondió (o se cerró) durante el add_roles: answer_roles ya no lo vio, se quita aquí
+        await _role_call("roles")
+        await member.remove_roles(rp, reason="Censo OGT: respondió")
+    return "SENT"
+
+async def _job_answer_roles(bot: commands.Bot, job: dict) -> str:
+    p = job["payload"]
+    guild = bot.get_guild(job["guild_id"])
+    if not guild:
+        return "SKIPPED"
+    member = await members.resolve(guild, p["user_id"])
+    if not member:
+        return "SKIPPED"
+
+    role_target = guild.get_role(p["role_id"]) if p.get("role_id") else None
+    role_no = guild.get_role(p["role_no_id"]) if p.get("role_no_id") else None
+    role_pending = guild.get_role(p["role_pending_id"]) if p.get("role_pending_id") else None
+
+    # quitar rol pendiente si existe (remove/add de roles son idempotentes: reintentar es seguro)
+    if role_pending and role_pending in member.roles:
+        await _role_call("answers")
+        await member.remove_roles(role_pending, reason="Censo OGT: respondió")
+
+    if p["answer"] == "NO":
+        # Quitar rol objetivo + agregar antiguo
+        if role_target and role_target in member.roles:
+            await _role_call("answers")
+            await member.remove_roles(role_target, reason="Censo OGT: indicó que no continúa")
+            print("✅ Rol objetivo removido a", member, "rol:", role_target.name)  # FIX
+        if role_no and role_no not in member.roles:
+            await _role_call("answers")
+            await member.add_roles(role_no, reason="Censo OGT: antiguo miembro")
+            print("✅ Rol NO agregado a", member, "rol:", role_no.name)  # FIX
+    return "SENT"
+
+# kind -> (handler, bucket que limita su ritmo, carril)
+JOB_HANDLERS = {
+    "dm": (_job_dm, dm_bucket, "dm"),
+    "role_pending": (_job_role_pending, role_bucket, "roles"),
+    "answer_roles": (_job_answer_roles, role_bucket, "answers"),
+    "log": (_job_log, None, "logs"),
+}
+# kinds que cobran role_bucket + presupuesto global por llamada REST (ver _role_call)
+PER_CALL_KINDS = {"role_pending", "answer_roles"}
+# carril -> workers
+JOB_LANES = {"dm": DM_CONCURRENCY, "roles": ROLE_WORKERS, "answers": 1, "logs": 1}
+# carril -> prioridad en el presupuesto global
+LANE_PRIORITY = {"answers": PRIORITY_ANSWER, "logs": PRIORITY_UPDATE, "roles": PRIORITY_BULK, "dm": PRIORITY_BULK}
+
 # =========================
 # Def Start Censo.
 # =========================
 async def start_censo(bot: commands.Bot, guild: discord.Guild, deadline_days: int = 7):
+    # NUEVO: espera su turno en el lock del guild (sin flag "busy" en disco)
+    async with guild_locks.hold(guild.id, "inicio"):
+        return await _start_censo_locked(bot, guild, deadline_days)
+
+async def _start_censo_locked(bot: commands.Bot, guild: discord.Guild, deadline_days: int):
     data = load_data()
     g = ensure_guild(data, guild.id)
 
-    # NUEVO: lock
-    if g.get("busy"):  # NUEVO
-        return False, "⚠️ El censo está ocupado (intenta de nuevo en 10s)."  # NUEVO
-    g["busy"] = True  # NUEVO
-    save_data(data)   # NUEVO
-
     # validar config
     if not g.get("role_id") or not g.get("role_no_id") or not g.get("log_channel_id"):
-        g["busy"] = False  # NUEVO
-        save_data(data)    # NUEVO
         return False, "Falta configurar Rol objetivo, Rol NO o Canal log (usa el panel)."
 
     role_target = guild.get_role(int(g["role_id"]))
@@ -533,10 +2522,29 @@ async def start_censo(bot: commands.Bot, guild: discord.Guild, deadline_days: in
     log_channel = guild.get_channel(int(g["log_channel_id"]))
 
     if not role_target or not role_no or not log_channel:
-        g["busy"] = False  # NUEVO
-        save_data(data)    # NUEVO
         return False, "No encontré el rol/canal por ID. Revisa selección en el panel."
 
+    # NUEVO: roster completo una vez por censo (si no, role.members sale incompleto)
+    await members.prefetch(guild)
+    members.reset(guild.id)
+
+    # NUEVO: el censo anterior va al archivo histórico (fuera del estado caliente)
+    if g.get("users") and g.get("censo_id"):
+        finalize_censo_stats(guild.id, g, "reemplazado")  # si no se cerró/venció antes
+        entry = {
+            "censo_id": g.get("censo_id"),  # FIX: antes se guardaba con el id/deadline del censo nuevo
+            "deadline_utc": g.get("deadline_utc"),
+            "role_id": g.get("role_id"),
+            "archived_utc": now_utc().isoformat(),
+            "users": _snapshot(g.get("users")),
+        }
+        try:
+            await store.archive_censo(guild.id, entry)
+        except Exception as e:
+            # queda en el estado y se reintenta al arrancar (migrate_history)
+            print("❌ No pude archivar el censo anterior:", repr(e))
+            g.setdefault("history", []).append(entry)
+
     # activar
     censo_id = f"{guild.id}-{int(now_utc().timestamp())}"
     g["censo_id"] = censo_id
@@ -544,27 +2552,19 @@ async def start_censo(bot: commands.Bot, guild: discord.Guild, deadline_days: in
     g["paused"] = False
     deadline = now_utc() + timedelta(days=int(deadline_days))
     g["deadline_utc"] = deadline.isoformat()
+    g["started_utc"] = now_utc().isoformat()  # NUEVO: base del tiempo de respuesta
 
     # NUEVO: limpiar log para que panel nuevo no confunda
     g["answers_log"] = []  # NUEVO
 
-    # guardar historial del censo anterior si existía
-    try:  # NUEVO
-        if g.get("users"):  # NUEVO
-            g.setdefault("history", [])  # NUEVO
-            g["history"].append({  # NUEVO
-                "censo_id": g.get("censo_id"),
-                "deadline_utc": g.get("deadline_utc"),
-                "users": g.get("users")
-            })
-            g["history"] = g["history"][-5:]  # NUEVO
-    except Exception:  # NUEVO
-        pass  # NUEVO
-
+    # NUEVO: los canales DM no dependen del censo; se conservan para no repetir create_dm
+    dm_channels = {uid: u["dm_channel_id"] for uid, u in (g.get("users") or {}).items() if u.get("dm_channel_id")}
     g["users"] = {}  # (nuevo censo = reset estados)
 
     # congelar miembros actuales del rol
     g.setdefault("users", {})
+    rp = guild.get_role(int(g["role_pending_id"])) if g.get("role_pending_id") else None
+    role_jobs = []
     for m in role_target.members:
         ukey = str(m.id)
         if ukey not in g["users"]:
@@ -574,41 +2574,33 @@ async def start_censo(bot: commands.Bot, guild: discord.Guild, deadline_days: in
                 "last_sent_utc": None,
                 "response_utc": None
             }
-        else:
-            if g["users"][ukey].get("status") not in ("YES", "NO"):
-                g["users"][ukey]["status"] = "PENDING"
+            if ukey in dm_channels:
+                g["users"][ukey]["dm_channel_id"] = dm_channels[ukey]
 
-        # rol pendiente opcional (throttle anti-429)
-        if g.get("role_pending_id"):
-            rp = guild.get_role(int(g["role_pending_id"]))
-            if rp and rp not in m.roles:
-                try:
-                    await m.add_roles(rp, reason="Censo OGT: pendiente de confirmar")
-                    await asyncio.sleep(random.uniform(0.8, 1.6))  # throttle anti-429
-                except Exception:
-                    pass
+        # rol pendiente opcional (NUEVO: pipeline en segundo plano a CENSO_ROLE_RATE)
+        if rp and rp not in m.roles:
+            role_jobs.append(("role_pending", f"role_pending:{censo_id}:{ukey}", guild.id, {"role_id": rp.id, "user_id": ukey, "censo_id": censo_id}))
 
-    save_data(data)
+    save_guild(guild.id)
+    jobs.enqueue_many(role_jobs)  # NUEVO: corre en paralelo a los DMs (carril propio)
+    STATUS_INDEXES[guild.id] = StatusIndex.build(g)  # NUEVO: índice del censo nuevo
+    reminders.schedule_guild(guild.id, g)  # NUEVO
 
     deadline_ts = int(deadline.timestamp())
 
-    await log_channel.send(
+    enqueue_log(  # NUEVO
+        guild.id, f"{censo_id}:start",
         f"📣 **CENSO DE ACTIVIDAD – OGT | Hell Let Loose**\n"
         f"Rol objetivo: <@&{g['role_id']}>\n"
         f"⏰ Deadline: <t:{deadline_ts}:F> (<t:{deadline_ts}:R>)\n"
-        f"📨 El bot enviará DM (anti-spam: 1 + 2 reintentos)."
+        f"📨 El bot enviará DM (anti-spam: 1 + 2 reintentos).",
+        immediate=True
     )
 
-    # envío inicial
-    sent = await send_to_pending(bot, guild.id, force=True)
-
-    # NUEVO: unlock
-    data = load_data()  # NUEVO
-    g = ensure_guild(data, guild.id)  # NUEVO
-    g["busy"] = False  # NUEVO
-    save_data(data)    # NUEVO
+    # envío inicial (NUEVO: se encola; los workers lo envían y el panel muestra el progreso)
+    queued = await _send_to_pending_locked(bot, guild.id)
 
-    return True, f"Censo iniciado. DMs enviados ahora: {sent}"
+    return True, f"Censo iniciado. DMs en cola: {queued} (progreso en el panel)."
 
 def should_send_next(attempts: int, last_sent_iso: str | None) -> bool:
     if not last_sent_iso:
@@ -620,40 +2612,62 @@ def should_send_next(attempts: int, last_sent_iso: str | None) -> bool:
     if last_dt.tzinfo is None:  # NUEVO
         last_dt = last_dt.replace(tzinfo=UTC)  # NUEVO
     hours = (now_utc() - last_dt).total_seconds() / 3600.0
-    return hours >= 24
+    return hours >= REMINDER_HOURS
+
+async def send_to_pending(bot: commands.Bot, guild_id: int) -> int:
+    # NUEVO: encola los DMs pendientes (bajo el lock del guild); los workers los envían.
+    # Los recordatorios de 24 h los encola el scheduler (ReminderScheduler._fire).
+    async with guild_locks.hold(guild_id, "reenvío"):
+        queued = await _send_to_pending_locked(bot, guild_id)
+
+    # NUEVO: refrescar panel después de encolar (para que se vea en tiempo real)
+    try:  # NUEVO
+        await refresh_panel_message(bot, guild_id)  # NUEVO
+    except Exception:  # NUEVO
+        pass  # NUEVO
+    return queued
 
-async def send_to_pending(bot: commands.Bot, guild_id: int, force: bool = False) -> int:
+async def _send_to_pending_locked(bot: commands.Bot, guild_id: int) -> int:
     data = load_data()
     g = ensure_guild(data, guild_id)
 
     if not g.get("active") or g.get("paused"):
         return 0
 
-    if g.get("busy"):  # NUEVO: no enviar si está iniciando censo
-        return 0
-
     guild = bot.get_guild(guild_id)
     if not guild:
         return 0
 
-    log_channel = guild.get_channel(int(g["log_channel_id"])) if g.get("log_channel_id") else None
-
     deadline = parse_dt_utc(g.get("deadline_utc"))
-    deadline_ts = int(deadline.timestamp())
-    attempts_max = int(g.get("attempts_max", 3))
-    sent_now = 0
-
-    user_items = list(g.get("users", {}).items())
-    random.shuffle(user_items)
 
-    for uid, u in user_items:
-        status = u.get("status", "PENDING")
+    # NUEVO: solo los candidatos (índice de estados en memoria / índice SQLite), no todo el roster
+    idx = status_index(guild_id, g)
+    if now_utc() > deadline:
+        for uid in idx.members("PENDING", "DM_FAILED"):
+            set_user_status(guild_id, g, uid, "EXPIRED")
+        uids = []
+    else:
+        uids = idx.members("PENDING")
+    random.shuffle(uids)
+
+    queued, _missing = await _enqueue_dms_resolving(guild, g, uids, force=True)
+    return queued
+
+def _enqueue_dms(guild: discord.Guild, g: dict, uids: list[str], force: bool) -> tuple[int, list[str]]:
+    # NUEVO: encola el DM que toca a cada uid; devuelve (encolados, uids sin member en caché)
+    guild_id = guild.id
+    attempts_max = int(g.get("attempts_max", 3))
+    censo_id = g.get("censo_id") or "NA"
+    batch = []
+    missing = []
 
-        if status in ("YES", "NO", "EXPIRED"):
+    for uid in uids:
+        u = g["users"].get(uid)
+        if u is None:
             continue
+        status = u.get("status", "PENDING")
 
-        if now_utc() > deadline:
-            u["status"] = "EXPIRED"
+        if status in ("YES", "NO", "EXPIRED", "REMOVED"):
             continue
 
         attempts = int(u.get("attempts", 0))
@@ -663,78 +2677,364 @@ async def send_to_pending(bot: commands.Bot, guild_id: int, force: bool = False)
         if not force and not should_send_next(attempts, u.get("last_sent_utc")):
             continue
 
-        member = guild.get_member(int(uid))
+        member = members.get(guild, uid)
         if not member:
+            missing.append(uid)
             continue
 
         if status == "DM_FAILED" and attempts >= 1:
             continue
 
-        censo_id = g.get("censo_id") or "NA"
-        view = CensoDMView(bot, guild_id, censo_id, int(uid))
-        dl_text = deadline.strftime("%Y-%m-%d %H:%M UTC")
-
-        if attempts == 0:
-            content = (
-                "👋 **Soldado de OGT**, \n\n"
-                "Estamos realizando una **actualización de actividad** del clan en *Hell Let Loose*.\n\n"
-                "👉 ¿Vas a **seguir activo** con OGT?\n\n"
-                f"⏰ **Fecha límite:** <t:{deadline_ts}:F>\n"
-                f"⌛ **Tiempo restante:** <t:{deadline_ts}:R>\n\n"
-                "✅ Si respondes **Sí**, mantienes tu rol.\n"
-                "❌ Si respondes **No**, pasarás a **Antiguo miembro OGT**.\n\n"
-                "— Staff OGT"
-            )
+        # clave = censo + usuario + número de intento: el mismo envío nunca se repite
+        payload = {"censo_id": censo_id, "user_id": uid, "attempt": attempts + 1}
+        batch.append(("dm", f"dm:{censo_id}:{uid}:{attempts + 1}", guild_id, payload))
+
+    return jobs.enqueue_many(batch), missing
+
+async def _enqueue_dms_resolving(guild: discord.Guild, g: dict, uids: list[str], force: bool) -> tuple[int, list[str]]:
+    # NUEVO: los que no están en caché se resuelven en lote y se encolan en una segunda pasada
+    queued, missing = _enqueue_dms(guild, g, uids, force)
+    if not missing:
+        return queued, missing
+    found = await members.resolve_many(guild, missing)
+    if found:
+        more, _ = _enqueue_dms(guild, g, list(found), force)
+        queued += more
+    return queued, [uid for uid in missing if uid not in found]
+
+# =========================
+# Scheduler de recordatorios (heap por vencimiento)
+# =========================
+# NUEVO: en vez de revisar todo cada 10 min, un min-heap con el próximo
+# vencimiento (recordatorio de cada usuario pendiente y deadline de cada censo).
+# Duerme hasta el primero y solo procesa esos usuarios. Las entradas viejas se
+# invalidan por versión (respondió, pausa, deadline extendido...).
+REMINDER_HOURS = 24
+REMINDER_RETRY_SECONDS = float(os.getenv("CENSO_REMINDER_RETRY", "600"))  # member no disponible
+
+def next_due(g: dict, u: dict) -> datetime | None:
+    if u.get("status", "PENDING") != "PENDING":
+        return None
+    if int(u.get("attempts", 0)) >= int(g.get("attempts_max", 3)):
+        return None
+    if not u.get("last_sent_utc"):
+        return now_utc()
+    return parse_dt_utc(u["last_sent_utc"]) + timedelta(hours=REMINDER_HOURS)
+
+class ReminderScheduler:  # NUEVO
+    DEADLINE = ""  # uid reservado para la entrada de deadline del guild
+
+    def __init__(self):
+        self.heap: list[tuple] = []  # (due_ts, seq, guild_id, uid, versión)
+        self.versions: dict[tuple[int, str], int] = {}
+        self.generations: dict[int, int] = {}  # pausar/cerrar invalida todo el guild
+        self._seq = itertools.count()
+        self._wake: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self._firing: dict[int, asyncio.Task] = {}  # FIX: un _fire en vuelo por guild
+        self._deferred: dict[int, list[str]] = {}  # vencidos mientras su guild seguía en vuelo
+        self.bot: commands.Bot | None = None
+
+    def _push(self, guild_id: int, uid: str, due: datetime):
+        key = (guild_id, uid)
+        ver = self.versions.get(key, 0) + 1
+        self.versions[key] = ver
+        entry = (due.timestamp(), next(self._seq), guild_id, uid, (self.generations.get(guild_id, 0), ver))
+        heapq.heappush(self.heap, entry)
+        if self._wake is not None and self.heap[0] is entry:
+            self._wake.set()
+
+    def _valid(self, guild_id: int, uid: str, version: tuple) -> bool:
+        return version == (self.generations.get(guild_id, 0), self.versions.get((guild_id, uid)))
+
+    def cancel(self, guild_id: int, uid: str):
+        key = (int(guild_id), str(uid))
+        if key in self.versions:
+            self.versions[key] += 1
+
+    def on_user_update(self, guild_id: int, g: dict, uid: str, u: dict):
+        guild_id = int(guild_id)
+        due = next_due(g, u) if g.get("active") and not g.get("paused") else None
+        if due is None or due > parse_dt_utc(g.get("deadline_utc")):
+            self.cancel(guild_id, uid)
         else:
-            content = (
-                "⏰ **Recordatorio OGT**\n\n"
-                "Aún no hemos recibido tu respuesta al censo de actividad.\n"
-                f"Por favor confirma antes del **{dl_text}** usando los botones.\n\n"
-                "— Staff OGT"
-            )
+            self._push(guild_id, str(uid), due)
 
-        try:
-            await member.send(content=content, view=view)
+    def retry_later(self, guild_id: int, uid: str):
+        self._push(int(guild_id), str(uid), now_utc() + timedelta(seconds=REMINDER_RETRY_SECONDS))
 
-            u["status"] = "PENDING"
-            u["attempts"] = attempts + 1
-            u["last_sent_utc"] = now_utc().isoformat()
-            sent_now += 1
+    def schedule_deadline(self, guild_id: int, g: dict):
+        if g.get("active") and not g.get("paused") and g.get("deadline_utc"):
+            self._push(int(guild_id), self.DEADLINE, parse_dt_utc(g.get("deadline_utc")))
 
-            # FIX: throttle simple (evita tz naive/aware y reduce 429)
-            await asyncio.sleep(random.uniform(1.2, 3.0))  # FIX
+    def unschedule_guild(self, guild_id: int):
+        guild_id = int(guild_id)
+        self.generations[guild_id] = self.generations.get(guild_id, 0) + 1
 
-        except discord.Forbidden:
-            u["status"] = "DM_FAILED"
-            u["attempts"] = attempts + 1
-            u["last_sent_utc"] = now_utc().isoformat()
-            if log_channel and member:
-                try:
-                    await log_channel.send(
-                        f"🚫 {member.mention} — No fue posible enviar DM (mensajes privados cerrados). "
-                        f"📌 Debe confirmar con el staff antes del deadline."
-                    )
-                except Exception:
-                    pass
-        except Exception:
-            pass
+    def schedule_guild(self, guild_id: int, g: dict):
+        # (re)programa un guild completo: inicio, reanudar, extender, arranque del proceso
+        guild_id = int(guild_id)
+        self.unschedule_guild(guild_id)
+        if not g.get("active") or g.get("paused"):
+            return
+        self.schedule_deadline(guild_id, g)
+        for uid in status_index(guild_id, g).members("PENDING"):
+            self.on_user_update(guild_id, g, uid, g["users"][uid])
 
-    save_data(data)
+    def start(self, bot: commands.Bot):
+        self.bot = bot
+        for gid_str, g in load_data().get("guilds", {}).items():
+            self.schedule_guild(int(gid_str), g)
+        if self._task is None or self._task.done():
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        for task in list(self._firing.values()):
+            task.cancel()
+        self._firing.clear()
+        self._deferred.clear()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _pop_due(self) -> dict[int, list[str]]:
+        due: dict[int, list[str]] = {}
+        now = time.time()
+        while self.heap and self.heap[0][0] <= now:
+            _, _, gid, uid, version = heapq.heappop(self.heap)
+            if self._valid(gid, uid, version):
+                due.setdefault(gid, []).append(uid)
+        return due
+
+    async def _run(self):
+        await self.bot.wait_until_ready()
+        while True:
+            self._wake.clear()
+            with metrics.timer("censo_scheduler_tick_seconds"):  # NUEVO
+                # FIX: cada guild vencida se lanza aparte y el bucle no la espera; una guild
+                # lenta no retrasa el próximo despertar ni a las demás
+                for gid, uids in self._pop_due().items():
+                    self._launch(gid, uids)
+            timeout = max(0.0, self.heap[0][0] - time.time()) if self.heap else None
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _launch(self, guild_id: int, uids: list[str]):
+        if guild_id in self._firing:
+            # ya hay un _fire de esta guild en vuelo: se atiende en cuanto termine
+            self._deferred.setdefault(guild_id, []).extend(uids)
+            return
+        task = spawn(self._fire(guild_id, uids))
+        self._firing[guild_id] = task
+        task.add_done_callback(lambda t: self._fired(guild_id, t))
+
+    def _fired(self, guild_id: int, task: asyncio.Task):
+        if self._firing.get(guild_id) is task:
+            del self._firing[guild_id]
+        if not task.cancelled() and task.exception() is not None:
+            print("❌ Error en scheduler de recordatorios:", repr(task.exception()))
+        pending = self._deferred.pop(guild_id, None)
+        if pending and not task.cancelled():
+            self._launch(guild_id, list(dict.fromkeys(pending)))
+
+    async def _fire(self, guild_id: int, uids: list[str]):
+        async with guild_locks.hold(guild_id, "scheduler"):
+            g = ensure_guild(load_data(), guild_id)
+            if not g.get("active") or g.get("paused"):
+                return
 
-    # NUEVO: refrescar panel después de envíos (para que se vea en tiempo real)
-    try:  # NUEVO
-        await refresh_panel_message(bot, guild_id)  # NUEVO
-    except Exception:  # NUEVO
-        pass  # NUEVO
+            if self.DEADLINE in uids:
+                uids = [uid for uid in uids if uid != self.DEADLINE]
+                if now_utc() >= parse_dt_utc(g.get("deadline_utc")):
+                    # deadline alcanzado: lo que no respondió vence
+                    dm_failed = status_index(guild_id, g).members("DM_FAILED")
+                    for uid in status_index(guild_id, g).members("PENDING", "DM_FAILED"):
+                        set_user_status(guild_id, g, uid, "EXPIRED")
+                    self.unschedule_guild(guild_id)
+                    finalize_censo_stats(guild_id, g, "vencido", dm_failed=dm_failed)  # NUEVO
+                    await refresh_panel_message(self.bot, guild_id)
+                    return
+                self.schedule_deadline(guild_id, g)
+
+            guild = self.bot.get_guild(guild_id)
+            if not guild:
+                missing, queued = uids, 0
+            else:
+                queued, missing = await _enqueue_dms_resolving(guild, g, uids, force=False)
+
+        # no se pudo resolver ni en lote: se reintenta más tarde (como hacía el tick de 10 min)
+        for uid in missing:
+            self.retry_later(guild_id, uid)
+        if queued:
+            await refresh_panel_message(self.bot, guild_id)
+
+reminders = ReminderScheduler()  # NUEVO
+
+# =========================
+# Roster dinámico (altas/bajas por eventos de miembros)
+# =========================
+# NUEVO: en modo "dinamico" el censo no queda congelado en role_target.members:
+# on_member_update / on_member_remove agregan o retiran una sola entrada (O(1)),
+# que entra directo al scheduler de recordatorios y a los contadores. Nunca se
+# vuelve a recorrer el roster. Quien ya respondió no se toca (el NO quita el rol).
+ROSTER_MODE = os.getenv("CENSO_ROSTER_MODE", "fijo").strip().lower()  # "fijo" | "dinamico"
+
+def roster_mode(g: dict) -> str:
+    return g.get("roster_mode") or ROSTER_MODE
+
+def _roster_guild(guild_id: int) -> dict | None:
+    g = ensure_guild(load_data(), guild_id)
+    if not g.get("active") or roster_mode(g) != "dinamico" or not g.get("role_id"):
+        return None
+    if not g.get("deadline_utc") or now_utc() >= parse_dt_utc(g["deadline_utc"]):
+        return None  # ya vence: el scheduler cierra el censo
+    return g
+
+def roster_add(guild: discord.Guild, g: dict, member: discord.Member) -> bool:
+    uid = str(member.id)
+    u = g["users"].get(uid)
+    if u is not None and u.get("status") != "REMOVED":
+        return False
+    # reingreso: conserva intentos/último envío; nuevo: entra como al iniciar el censo
+    fields = {"removed_utc": None} if u is not None else {"attempts": 0, "last_sent_utc": None, "response_utc": None}
+    set_user_status(guild.id, g, uid, "PENDING", **fields)  # agenda su DM en el scheduler
+
+    rp = guild.get_role(int(g["role_pending_id"])) if g.get("role_pending_id") else None
+    if rp and rp not in member.roles:
+        censo_id = g.get("censo_id")
+        jobs.enqueue_many([("role_pending", f"role_pending:{censo_id}:{uid}", guild.id, {"role_id": rp.id, "user_id": uid, "censo_id": censo_id})])
+    enqueue_log(guild.id, f"{g.get('censo_id')}:roster_add:{uid}:{int(now_utc().timestamp())}", f"➕ {member.mention} entró al censo (rol objetivo).")
+    return True
+
+def roster_remove(guild_id: int, g: dict, uid: str, mention: str, reason: str) -> bool:
+    u = g["users"].get(uid)
+    if u is None or u.get("status") not in ("PENDING", "DM_FAILED"):
+        return False
+    set_user_status(guild_id, g, uid, "REMOVED", removed_utc=now_utc().isoformat())  # cancela recordatorios
+    enqueue_log(guild_id, f"{g.get('censo_id')}:roster_remove:{uid}:{int(now_utc().timestamp())}", f"➖ {mention} salió del censo ({reason}).")
+    return True
 
-    return sent_now
+# =========================
+# Estadísticas por censo (agregados precalculados)
+# =========================
+# NUEVO: al cerrar o vencer un censo se calcula una sola vez un resumen chico
+# (g["stats"]); /censo_estadisticas solo lee esos resúmenes.
+STATS_KEEP = int(os.getenv("CENSO_STATS_KEEP", "50"))
+
+def _percentile(ordered: list, p: float):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+def finalize_censo_stats(guild_id: int, g: dict, reason: str, dm_failed: list[str] | None = None) -> dict | None:
+    censo_id = g.get("censo_id")
+    users = g.get("users") or {}
+    stats = g.setdefault("stats", [])
+    if not censo_id or not users or any(st.get("censo_id") == censo_id for st in stats):
+        return None  # sin censo o ya calculado
+
+    started = parse_dt_utc(g["started_utc"]) if g.get("started_utc") else datetime.fromtimestamp(_censo_sort_key(censo_id), UTC)
+    counts = collections.Counter()
+    answer_times = []
+    first_dm = 0
+    for u in users.values():
+        counts[u.get("status", "PENDING")] += 1
+        if u.get("status") in ("YES", "NO") and u.get("response_utc"):
+            answer_times.append((parse_dt_utc(u["response_utc"]) - started).total_seconds())
+            if int(u.get("attempts", 0)) <= 1:
+                first_dm += 1
+    answer_times.sort()
+    answered = counts["YES"] + counts["NO"]
+    total = len(users) - counts["REMOVED"]  # los retirados no cuentan para la tasa
+
+    # racha de DMs cerrados: cuántos censos seguidos falló cada miembro
+    failed = dm_failed if dm_failed is not None else [uid for uid, u in users.items() if u.get("status") == "DM_FAILED"]
+    streak = g.get("dm_failed_streak", {})
+    g["dm_failed_streak"] = {uid: streak.get(uid, 0) + 1 for uid in failed}
+
+    entry = {
+        "censo_id": censo_id,
+        "reason": reason,
+        "closed_utc": now_utc().isoformat(),
+        "total": total,
+        "counts": dict(counts),
+        "response_rate": round(answered / total, 4) if total else None,
+        "answer_p50_s": _percentile(answer_times, 50),
+        "answer_p90_s": _percentile(answer_times, 90),
+        "answer_p99_s": _percentile(answer_times, 99),
+        "first_dm_share": round(first_dm / answered, 4) if answered else None,
+        "dm_failed": len(failed),
+        "dm_failed_repeat": sum(1 for n in g["dm_failed_streak"].values() if n >= 2),
+    }
+    stats.append(entry)
+    if STATS_KEEP > 0:
+        g["stats"] = stats[-STATS_KEEP:]
+    save_config(guild_id)
+    return entry
+
+def _fmt_duration(seconds) -> str:
+    if seconds is None:
+        return "—"
+    if seconds < 3600:
+        return f"{seconds / 60:.0f} min"
+    return f"{seconds / 3600:.1f} h"
+
+# =========================
+# Exportar resultados (CSV / JSONL)
+# =========================
+# NUEVO: las filas se generan una a una y van directo a un archivo temporal;
+# cada EXPORT_CHUNK filas se cede el loop, así 50k miembros no lo bloquean.
+EXPORT_FIELDS = ("user_id", "display_name", "status", "attempts", "last_sent_utc", "response_utc", "response_latency_s")
+EXPORT_CHUNK = 1000
+
+def _export_rows(guild: discord.Guild | None, users: dict):
+    for uid in list(users):  # claves fijas: el censo puede seguir cambiando valores
+        u = users.get(uid)
+        if u is None:
+            continue
+        member = members.get(guild, uid) if guild else None
+        latency = None
+        if u.get("last_sent_utc") and u.get("response_utc"):
+            latency = round((parse_dt_utc(u["response_utc"]) - parse_dt_utc(u["last_sent_utc"])).total_seconds(), 1)
+        yield {
+            "user_id": uid,
+            "display_name": member.display_name if member else "",
+            "status": u.get("status", "PENDING"),
+            "attempts": int(u.get("attempts", 0)),
+            "last_sent_utc": u.get("last_sent_utc"),
+            "response_utc": u.get("response_utc"),
+            "response_latency_s": latency,
+        }
+
+async def write_export(guild: discord.Guild | None, users: dict, fmt: str, fh) -> int:
+    writer = None
+    if fmt == "csv":
+        writer = csv.DictWriter(fh, fieldnames=EXPORT_FIELDS)
+        writer.writeheader()
+    n = 0
+    for row in _export_rows(guild, users):
+        if writer is not None:
+            writer.writerow(row)
+        else:
+            fh.write(json.dumps(row, ensure_ascii=False, separators=(",", ":")) + "\n")
+        n += 1
+        if n % EXPORT_CHUNK == 0:
+            await asyncio.sleep(0)
+    return n
 
 # =========================
 # Bot + Slash commands
 # =========================
 intents = discord.Intents.default()
 intents.members = True  # necesario para roles/members
-bot = commands.Bot(command_prefix="!", intents=intents)
+bot = commands.Bot(command_prefix="!", intents=intents, http_trace=http_trace)
 
 @bot.tree.command(name="censo_set_pendiente", description="Configura (opcional) el rol 'Pendiente de confirmar' para el censo.")
 @app_commands.checks.has_permissions(manage_guild=True)
@@ -743,12 +3043,74 @@ async def censo_set_pendiente(interaction: discord.Interaction, rol: discord.Rol
     data = load_data()
     g = ensure_guild(data, interaction.guild_id)
     g["role_pending_id"] = rol.id if rol else None
-    save_data(data)
+    save_config(interaction.guild_id)
     await interaction.response.send_message(
         f"✅ Rol Pendiente actualizado: {rol.mention if rol else 'None (quitado)'}",
         ephemeral=True
     )
 
+@bot.tree.command(name="censo_log_modo", description="Elige cómo se publica el log: resumen agrupado o un mensaje por evento.")
+@app_commands.checks.has_permissions(manage_guild=True)
+@app_commands.describe(modo="digest = resumen agrupado, evento = un mensaje por respuesta")
+@app_commands.choices(modo=[
+    app_commands.Choice(name="Resumen (digest)", value="digest"),
+    app_commands.Choice(name="Un mensaje por evento", value="evento"),
+])
+async def censo_log_modo(interaction: discord.Interaction, modo: app_commands.Choice[str]):  # NUEVO
+    data = load_data()
+    g = ensure_guild(data, interaction.guild_id)
+    g["log_mode"] = modo.value
+    save_config(interaction.guild_id)
+    if modo.value != "digest" and interaction.guild_id in LOG_DIGESTS:
+        LOG_DIGESTS[interaction.guild_id].flush()
+    await interaction.response.send_message(f"✅ Modo de log: {modo.name}", ephemeral=True)
+
+@bot.tree.command(name="censo_roster_modo", description="Elige si el censo sigue los cambios del rol objetivo o queda fijo al iniciar.")
+@app_commands.checks.has_permissions(manage_guild=True)
+@app_commands.describe(modo="fijo = miembros al iniciar, dinamico = altas/bajas del rol durante el censo")
+@app_commands.choices(modo=[
+    app_commands.Choice(name="Fijo (al iniciar)", value="fijo"),
+    app_commands.Choice(name="Dinámico (sigue el rol)", value="dinamico"),
+])
+async def censo_roster_modo(interaction: discord.Interaction, modo: app_commands.Choice[str]):  # NUEVO
+    data = load_data()
+    g = ensure_guild(data, interaction.guild_id)
+    g["roster_mode"] = modo.value
+    save_config(interaction.guild_id)
+    await interaction.response.send_message(
+        f"✅ Roster: {modo.name}" + (" (aplica a los cambios desde ahora, sin re-escanear)" if modo.value == "dinamico" and g.get("active") else ""),
+        ephemeral=True
+    )
+
+@bot.listen("on_member_update")
+async def _roster_member_update(before: discord.Member, after: discord.Member):
+    # NUEVO: solo importa si cambió el rol objetivo; O(1) por evento
+    g = _roster_guild(after.guild.id)
+    if g is None:
+        return
+    role_id = int(g["role_id"])
+    had, has = before.get_role(role_id) is not None, after.get_role(role_id) is not None
+    if had == has:
+        return
+    if has:
+        changed = roster_add(after.guild, g, after)
+    else:
+        changed = roster_remove(after.guild.id, g, str(after.id), after.mention, "perdió el rol objetivo")
+    if changed:
+        panel_renderer(bot, after.guild.id).request()
+
+@bot.listen("on_member_remove")
+async def _roster_member_remove(member: discord.Member):
+    members.forget(member.guild.id, member.id)
+    g = _roster_guild(member.guild.id)
+    if g is not None and roster_remove(member.guild.id, g, str(member.id), member.mention, "dejó el servidor"):
+        panel_renderer(bot, member.guild.id).request()
+
+@bot.listen("on_interaction")
+async def _charge_interaction(interaction: discord.Interaction):
+    # NUEVO: ack + follow-up salen sin esperar; la ola de DMs cede ese hueco
+    outbound_bucket.charge(2)
+
 @bot.event
 async def on_ready():
     print(f"✅ Conectado como {bot.user} (ID: {bot.user.id})")
@@ -756,32 +3118,27 @@ async def on_ready():
 @bot.tree.command(name="censo_panel", description="Muestra el panel staff del censo OGT.")
 @app_commands.checks.has_permissions(manage_guild=True)
 async def censo_panel(interaction: discord.Interaction):
-    embed = build_status_embed(interaction.guild_id)
-
     data = load_data()  # NUEVO
     g = ensure_guild(data, interaction.guild_id)  # NUEVO
 
     # NUEVO: si ya existe panel guardado, lo editamos (no duplicar)
-    ch_id = g.get("panel_channel_id")  # NUEVO
-    msg_id = g.get("panel_message_id")  # NUEVO
-    if ch_id and msg_id:
-        try:
-            channel = interaction.guild.get_channel(int(ch_id))
-            if channel:
-                msg = await channel.fetch_message(int(msg_id))
-                await msg.edit(embed=embed, view=CensoPanelView(bot))
-                await interaction.response.send_message("✅ Panel actualizado.", ephemeral=True)
-                return
-        except Exception:
-            pass
+    if g.get("panel_channel_id") and g.get("panel_message_id"):
+        if await panel_renderer(bot, interaction.guild_id).render(force=True):
+            await interaction.response.send_message("✅ Panel actualizado.", ephemeral=True)
+            return
 
     # FIX: público (ephemeral=False)
-    await interaction.response.send_message(embed=embed, view=CensoPanelView(bot), ephemeral=False)  # FIX
+    embed = build_status_embed(interaction.guild_id)
+    renderer = panel_renderer(bot, interaction.guild_id)
+    renderer.view = renderer.view or CensoPanelView(bot)
+    await interaction.response.send_message(embed=embed, view=renderer.view, ephemeral=False)  # FIX
     msg = await interaction.original_response()  # NUEVO
 
     g["panel_channel_id"] = interaction.channel_id  # NUEVO
     g["panel_message_id"] = msg.id  # NUEVO
-    save_data(data)  # NUEVO
+    save_config(interaction.guild_id)  # NUEVO
+    renderer.last_render = embed.to_dict()
+    renderer.last_edit = time.monotonic()
 
 @bot.tree.command(name="censo_iniciar", description="Inicia el censo (si ya configuraste todo en el panel).")
 @app_commands.checks.has_permissions(manage_guild=True)
@@ -797,27 +3154,116 @@ async def censo_iniciar(interaction: discord.Interaction, dias: int = 7):
 @app_commands.checks.has_permissions(manage_guild=True)
 async def censo_reenviar_pendientes(interaction: discord.Interaction):
     await interaction.response.defer(ephemeral=True)
-    sent = await send_to_pending(bot, interaction.guild_id, force=True)
-    await interaction.followup.send(f"📨 Envíos disparados ahora: {sent}", ephemeral=True)
+    queued = await send_to_pending(bot, interaction.guild_id)  # NUEVO: solo encola
+    await interaction.followup.send(f"📨 DMs en cola: {queued} (progreso en el panel).", ephemeral=True)
 
-@tasks.loop(minutes=10)
-async def censo_scheduler():
-    try:
-        data = load_data()
-        for gid_str, g in list(data.get("guilds", {}).items()):
-            try:
-                gid = int(gid_str)
-            except Exception:
-                continue
-            if not g.get("active") or g.get("paused") or g.get("busy"):
-                continue
-            await send_to_pending(bot, gid, force=False)
-    except Exception as e:
-        print("❌ Error en censo_scheduler:", repr(e))
+@bot.tree.command(name="censo_historial", description="Muestra los censos anteriores archivados (resultados por estado).")
+@app_commands.checks.has_permissions(manage_guild=True)
+async def censo_historial(interaction: discord.Interaction):  # NUEVO
+    await interaction.response.defer(ephemeral=True)
+    lines = []
+    for censo_id in await store.history(interaction.guild_id):  # solo aquí se lee el archivo
+        entry = await store.archived_censo(interaction.guild_id, censo_id)
+        if not entry:
+            continue
+        counts = collections.Counter(u.get("status", "PENDING") for u in (entry.get("users") or {}).values())
+        try:
+            when = f"<t:{int(parse_dt_utc(entry.get('deadline_utc')).timestamp())}:d>"
+        except Exception:
+            when = str(entry.get("deadline_utc"))
+        lines.append(
+            f"**{censo_id}** · deadline {when} · ✅ {counts['YES']} · ❌ {counts['NO']} · "
+            f"⏳ {counts['PENDING']} · 🚫 {counts['DM_FAILED']} · ⌛ {counts['EXPIRED']}"
+            + (f" · 🚪 {counts['REMOVED']}" if counts["REMOVED"] else "")
+        )
+    await interaction.followup.send("\n".join(lines) if lines else "No hay censos archivados.", ephemeral=True)
+
+def build_stats_embed(g: dict) -> discord.Embed:
+    e = discord.Embed(title="📊 Censo OGT — Estadísticas", color=discord.Color.blurple())
+    for st in reversed(g.get("stats", [])[-10:]):
+        first = f"{st['first_dm_share'] * 100:.0f}%" if st.get("first_dm_share") is not None else "—"
+        # FIX: None si todos quedaron retirados (roster dinámico)
+        rate = f"{st['response_rate'] * 100:.0f}%" if st.get("response_rate") is not None else "—"
+        e.add_field(
+            name=f"{st['censo_id']} ({st.get('reason')})",
+            value=(
+                f"Respondió {rate} de {st['total']} · "
+                f"✅ {st['counts'].get('YES', 0)} · ❌ {st['counts'].get('NO', 0)}\n"
+                f"⏱️ p50 {_fmt_duration(st.get('answer_p50_s'))} · p90 {_fmt_duration(st.get('answer_p90_s'))} · "
+                f"p99 {_fmt_duration(st.get('answer_p99_s'))}\n"
+                f"📨 Con el 1er DM {first} · 🚫 DM cerrado {st['dm_failed']} (repiten {st['dm_failed_repeat']})"
+            ),
+            inline=False
+        )
+    repeat = sorted(
+        ((n, uid) for uid, n in g.get("dm_failed_streak", {}).items() if n >= 2),
+        reverse=True
+    )[:10]
+    if repeat:
+        e.add_field(
+            name="🚫 DM cerrado en censos seguidos",
+            value="\n".join(f"<@{uid}> — {n} censos" for n, uid in repeat),
+            inline=False
+        )
+    return e
 
-@censo_scheduler.before_loop
-async def before_scheduler():
-    await bot.wait_until_ready()
+@bot.tree.command(name="censo_estadisticas", description="Tendencias entre censos: tasa de respuesta, tiempos y DMs cerrados.")
+@app_commands.checks.has_permissions(manage_guild=True)
+async def censo_estadisticas(interaction: discord.Interaction):  # NUEVO
+    g = ensure_guild(load_data(), interaction.guild_id)
+    if not g.get("stats"):
+        await interaction.response.send_message("Aún no hay censos cerrados o vencidos con estadísticas.", ephemeral=True)
+        return
+    await interaction.response.send_message(embed=build_stats_embed(g), ephemeral=True)
+
+@bot.tree.command(name="censo_exportar", description="Exporta el resultado por miembro del censo actual o de uno archivado.")
+@app_commands.checks.has_permissions(manage_guild=True)
+@app_commands.describe(formato="csv o jsonl", censo="ID de un censo archivado (vacío = censo actual)")
+@app_commands.choices(formato=[
+    app_commands.Choice(name="CSV", value="csv"),
+    app_commands.Choice(name="JSONL", value="jsonl"),
+])
+async def censo_exportar(interaction: discord.Interaction, formato: app_commands.Choice[str], censo: str | None = None):  # NUEVO
+    await interaction.response.defer(ephemeral=True)  # el archivo puede tardar más de 3 s
+    g = ensure_guild(load_data(), interaction.guild_id)
+    if censo and censo != g.get("censo_id"):
+        entry = await store.archived_censo(interaction.guild_id, censo)
+        if not entry:
+            await interaction.followup.send(f"❌ No encontré el censo archivado `{censo}` (ver /censo_historial).", ephemeral=True)
+            return
+        censo_id, users = censo, entry.get("users") or {}
+    else:
+        censo_id, users = g.get("censo_id"), g.get("users", {})
+    if not censo_id or not users:
+        await interaction.followup.send("No hay censo para exportar.", ephemeral=True)
+        return
+
+    fmt = formato.value
+    fd, path = tempfile.mkstemp(prefix="censo-export-", suffix=f".{fmt}")
+    try:
+        with open(fd, "w", encoding="utf-8", newline="") as fh:
+            rows = await write_export(interaction.guild, users, fmt, fh)
+        filename = f"censo-{censo_id}.{fmt}"
+        limit = getattr(interaction.guild, "filesize_limit", 10 * 1024 * 1024)
+        if os.path.getsize(path) > limit:
+            # comprimir fuera del loop; si aun así no cabe, avisar
+            def _gzip():
+                with open(path, "rb") as src, gzip.open(path + ".gz", "wb") as dst:
+                    shutil.copyfileobj(src, dst)
+            await asyncio.to_thread(_gzip)
+            os.replace(path + ".gz", path)
+            filename += ".gz"
+            if os.path.getsize(path) > limit:
+                await interaction.followup.send("❌ El archivo supera el límite de adjuntos del servidor.", ephemeral=True)
+                return
+        await interaction.followup.send(
+            f"📄 Censo `{censo_id}`: {rows} miembro(s).",
+            file=discord.File(path, filename=filename),
+            ephemeral=True
+        )
+    finally:
+        with contextlib.suppress(OSError):
+            os.remove(path)
 
 @bot.command()
 @commands.is_owner()
@@ -827,8 +3273,21 @@ async def sync(ctx: commands.Context):
 
 # --- setup_hook ---
 async def _setup_hook():  # FIX
-    if not censo_scheduler.is_running():
-        censo_scheduler.start()
+    await store.load()  # NUEVO: carga única del estado, fuera del loop
+    store.migrate_history()  # NUEVO: historial heredado -> archivo comprimido
+    store.start()  # NUEVO: writer diferido (hilo propio)
+    spawn(watch_loop_lag())  # NUEVO
+    rebuild_status_indexes()  # NUEVO: contadores desde las filas
+    jobs.start(bot)  # NUEVO: reanuda la cola de acciones pendientes
+    restore_log_digests()  # NUEVO: líneas del log que esperaban su resumen
+    try:  # NUEVO: Railway detiene con SIGTERM
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, lambda: asyncio.create_task(bot.close()))
+    except (NotImplementedError, RuntimeError):
+        pass
+
+    bot.add_dynamic_items(CensoAnswerButton, LegacyCensoAnswerButton)  # NUEVO: botones del DM sin vistas por mensaje
+    await metrics.start()  # NUEVO: /metrics si CENSO_METRICS_PORT > 0
+    reminders.start(bot)  # NUEVO: heap de vencimientos (reemplaza el tick de 10 min)
 
     # FIX: si GUILD_ID_TEST no está definido, no intentes sync guild (evita 403 Missing Access)
     if GUILD_ID_TEST and GUILD_ID_TEST != 0:  # FIX
@@ -848,7 +3307,28 @@ async def _setup_hook():  # FIX
 
 bot.setup_hook = _setup_hook  # FIX
 
+# NUEVO: flush forzado al apagar (close normal, SIGTERM de Railway o salida del proceso)
+_bot_close = bot.close
+
+async def _close():
+    await reminders.close()
+    flush_log_digests()  # lo pendiente queda en la cola persistente
+    await jobs.close()
+    await store.close()
+    await metrics.close()
+    await _bot_close()
+
+bot.close = _close
+atexit.register(store.flush)
+
 if __name__ == "__main__":
+    # NUEVO: importación única JSON -> SQLite: python main.py importar-json [archivo.json]
+    if len(sys.argv) > 1 and sys.argv[1] == "importar-json":
+        src = sys.argv[2] if len(sys.argv) > 2 else DATA_FILE
+        n = import_json_to_sqlite(src)
+        print(f"✅ Importados {n} guild(s) de {src} a {DB_FILE}.")
+        sys.exit(0)
+
     token = os.getenv("DISCORD_TOKEN")
     if not token:
         raise RuntimeError("Falta DISCORD_TOKEN en variables de entorno.")
@@ -0,0 +1,147 @@
+import asyncio
+import types
+
+import main
+
+
+class _Response:
+    def __init__(self):
+        self.messages = []
+
+    def is_done(self):
+        return bool(self.messages)
+
+    async def send_message(self, content=None, **kwargs):
+        self.messages.append(content)
+
+
+class _SlowDM:
+    # el envío queda "en vuelo" hasta que el test lo libera
+    id = 555
+
+    def __init__(self):
+        self.started = asyncio.Event()
+        self.release = asyncio.Event()
+
+    async def send(self, **kwargs):
+        self.started.set()
+        await self.release.wait()
+
+
+def _setup(tmp_path, monkeypatch):
+    store = main.CensoStore(main.JsonBackend(str(tmp_path / "censo_data.json"), None))
+    g = {
+        "active": True, "paused": False, "censo_id": "1-100", "attempts_max": 3,
+        "deadline_utc": (main.now_utc() + main.timedelta(days=1)).isoformat(),
+        "users": {"7": {"status": "PENDING", "attempts": 1, "last_sent_utc": None, "response_utc": None}},
+    }
+    store.data = {"guilds": {"1": g}}
+    monkeypatch.setattr(main, "store", store)
+    monkeypatch.setattr(main, "jobs", main.JobQueue(str(tmp_path / "censo_jobs.jsonl")))
+    dm = _SlowDM()
+    member = types.SimpleNamespace(id=7, mention="<@7>", dm_channel=dm, roles=[])
+    guild = types.SimpleNamespace(id=1, get_member=lambda uid: member if uid == 7 else None)
+    bot = types.SimpleNamespace(get_guild=lambda gid: guild if gid == 1 else None)
+    job = {"guild_id": 1, "payload": {"censo_id": "1-100", "user_id": "7", "attempt": 2}}
+    return g, dm, bot, job
+
+
+def test_answer_during_reminder_is_not_overwritten(tmp_path, monkeypatch):
+    g, dm, bot, job = _setup(tmp_path, monkeypatch)
+
+    async def run():
+        send = asyncio.create_task(main._job_dm(bot, job))
+        await dm.started.wait()
+        interaction = types.SimpleNamespace(user=types.SimpleNamespace(id=7), response=_Response(), created_at=main.discord.utils.utcnow())
+        await main.apply_censo_answer(None, interaction, 1, "1-100", 7, "YES")
+        dm.release.set()
+        return await send, interaction.response.messages
+
+    result, acks = asyncio.run(run())
+    assert acks == ["✅ Respuesta registrada. Gracias."]
+    assert result == "SENT"
+    assert g["users"]["7"]["status"] == "YES"
+    assert main.status_index(1, g).counts()["YES"] == 1
+
+
+def test_new_census_during_reminder_is_not_touched(tmp_path, monkeypatch):
+    g, dm, bot, job = _setup(tmp_path, monkeypatch)
+
+    async def run():
+        send = asyncio.create_task(main._job_dm(bot, job))
+        await dm.started.wait()
+        g["censo_id"] = "1-200"
+        g["users"] = {"7": {"status": "PENDING", "attempts": 0, "last_sent_utc": None, "response_utc": None}}
+        dm.release.set()
+        return await send
+
+    asyncio.run(run())
+    assert g["users"]["7"]["attempts"] == 0
+
+
+def test_paused_census_skips_queued_dm(tmp_path, monkeypatch):
+    g, dm, bot, job = _setup(tmp_path, monkeypatch)
+    g["paused"] = True
+
+    assert asyncio.run(main._job_dm(bot, job)) == "SKIPPED"
+    assert not dm.started.is_set()
+
+
+def _role_job(tmp_path, monkeypatch):
+    g, dm, bot, _ = _setup(tmp_path, monkeypatch)
+    added = []
+    member = bot.get_guild(1).get_member(7)
+
+    async def add_roles(role, **kwargs):
+        added.append(role)
+
+    member.add_roles = add_roles
+    bot.get_guild(1).get_role = lambda rid: "pendiente" if rid == 9 else None
+    job = {"guild_id": 1, "key": "role_pending:1-100:7", "payload": {"role_id": 9, "user_id": "7", "censo_id": "1-100"}}
+    return g, bot, job, added
+
+
+def test_role_pending_skips_answered_user(tmp_path, monkeypatch):
+    g, bot, job, added = _role_job(tmp_path, monkeypatch)
+    g["users"]["7"]["status"] = "YES"
+
+    assert asyncio.run(main._job_role_pending(bot, job)) == "SKIPPED"
+    assert added == []
+
+
+def test_role_pending_skips_closed_census(tmp_path, monkeypatch):
+    g, bot, job, added = _role_job(tmp_path, monkeypatch)
+    g["active"] = False
+
+    assert asyncio.run(main._job_role_pending(bot, job)) == "SKIPPED"
+    assert added == []
+
+
+def test_scheduler_slow_guild_does_not_block_others():
+    sched = main.ReminderScheduler()
+    release = asyncio.Event()
+    fired = []
+
+    async def fire(guild_id, uids):
+        fired.append((guild_id, uids))
+        if guild_id == 1:
+            await release.wait()
+
+    sched._fire = fire
+
+    async def run():
+        sched._launch(1, ["a"])
+        sched._launch(2, ["b"])
+        await asyncio.sleep(0)
+        sched._launch(1, ["c"])  # guild 1 sigue en vuelo: queda diferido
+        await asyncio.sleep(0)
+        before = list(fired)
+        release.set()
+        for _ in range(3):
+            await asyncio.sleep(0)
+        return before
+
+    before = asyncio.run(run())
+    assert before == [(1, ["a"]), (2, ["b"])]
+    assert fired[-1] == (1, ["c"])
+    assert not sched._firing
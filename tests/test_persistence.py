@@ -0,0 +1,80 @@
+import asyncio
+import os
+import shutil
+
+import pytest
+
+import main
+
+
+def _user(status):
+    return {"status": status, "attempts": 1, "last_sent_utc": None, "response_utc": None}
+
+
+def _event(uid, status):
+    return ("1", uid, "c1", main.now_utc().isoformat(), _user(status))
+
+
+def test_backup_recovery_replays_archived_journal_segments(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(main, "BACKUP_INTERVAL", 0)  # backup en cada compactación
+    monkeypatch.setattr(main, "JOURNAL_ARCHIVES", 0)  # aun así se conservan los que cubren backups
+    backend = main.JsonBackend("censo_data.json", "censo_journal.jsonl")
+    data = {"guilds": {"1": {"censo_id": "c1", "users": {}}}}
+    backend.write(data, {"1"}, set(), set(), full=True)
+
+    # A -> compacta (backup del snapshot vacío); B -> compacta (backup con A); C queda en el journal
+    for uid, compact in (("a", True), ("b", True), ("c", False)):
+        data["guilds"]["1"]["users"][uid] = _user("YES")
+        backend.write(data, set(), set(), set(), events=[_event(uid, "YES")], full=compact)
+    backend.close()
+
+    # el snapshot vivo se daña: se recupera el backup más nuevo (solo tiene A)
+    (tmp_path / "censo_data.json").write_bytes(b"{roto")
+    loaded = main.JsonBackend("censo_data.json", "censo_journal.jsonl").load()
+
+    assert sorted(loaded["guilds"]["1"]["users"]) == ["a", "b", "c"]
+
+
+SAMPLE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "censo_data.json")
+
+
+@pytest.mark.parametrize("storage", ["json", "sqlite"])
+def test_migrated_history_survives_archiving_the_live_census(tmp_path, monkeypatch, storage):
+    # el censo_data.json del repo: la última entrada del historial tiene el id del censo vigente
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(main, "HISTORY_KEEP", 0)
+    shutil.copy(SAMPLE, "censo_data.json")
+    backend = main.SqliteBackend("censo_data.db") if storage == "sqlite" else main.JsonBackend("censo_data.json", "censo_journal.jsonl")
+    store = main.CensoStore(backend)
+
+    async def run():
+        await store.load()
+        gid, g = next(iter(store.get()["guilds"].items()))
+        live_id = g["censo_id"]
+        legacy = {h["censo_id"]: h for h in g["history"]}[live_id]
+        assert store.migrate_history() == 5
+        # lo que hace _start_censo_locked con el censo vigente al iniciar uno nuevo
+        archived_id = await store.archive_censo(gid, {
+            "censo_id": live_id, "deadline_utc": g["deadline_utc"], "role_id": g["role_id"],
+            "archived_utc": main.now_utc().isoformat(), "users": main._snapshot(g["users"]),
+        })
+        ids = await store.history(gid)
+        previo = await store.archived_censo(gid, f"{live_id}~previo")
+        live = await store.archived_censo(gid, archived_id)
+        await store.close()
+        return live_id, archived_id, ids, legacy, previo, live, g
+
+    live_id, archived_id, ids, legacy, previo, live, g = asyncio.run(run())
+    assert archived_id == live_id
+    assert len(ids) == 6 and f"{live_id}~previo" in ids
+    assert previo["users"] == legacy["users"] and previo["legacy_censo_id"] == live_id
+    assert live["users"] == g["users"]
+
+
+def test_archive_put_refuses_to_overwrite(tmp_path):
+    archive = main.FileArchive(str(tmp_path))
+    archive.put("1", {"censo_id": "1-100", "users": {"a": {"status": "YES"}}})
+    with pytest.raises(FileExistsError):
+        archive.put("1", {"censo_id": "1-100", "users": {}})
+    assert archive.get("1", "1-100")["users"] == {"a": {"status": "YES"}}
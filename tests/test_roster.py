@@ -0,0 +1,44 @@
+import asyncio
+import types
+
+import main
+
+
+def _removed_censo():
+    users = {str(i): {"status": "REMOVED", "attempts": 1, "last_sent_utc": None, "response_utc": None} for i in range(3)}
+    return {"censo_id": "1-100", "started_utc": main.now_utc().isoformat(), "users": users}
+
+
+def test_stats_when_every_member_was_removed(monkeypatch):
+    monkeypatch.setattr(main, "save_config", lambda guild_id: None)
+    g = _removed_censo()
+
+    entry = main.finalize_censo_stats(1, g, "cerrado")
+
+    assert entry["total"] == 0 and entry["response_rate"] is None
+    field = main.build_stats_embed(g).fields[0]
+    assert field.value.startswith("Respondió — de 0")
+
+
+class _Response:
+    def __init__(self):
+        self.messages = []
+
+    def is_done(self):
+        return bool(self.messages)
+
+    async def send_message(self, content=None, **kwargs):
+        self.messages.append(content)
+
+
+def test_removed_member_cannot_answer(tmp_path, monkeypatch):
+    store = main.CensoStore(main.JsonBackend(str(tmp_path / "censo_data.json"), None))
+    g = {**_removed_censo(), "active": True}
+    store.data = {"guilds": {"1": g}}
+    monkeypatch.setattr(main, "store", store)
+    interaction = types.SimpleNamespace(user=types.SimpleNamespace(id=0), response=_Response())
+
+    asyncio.run(main.apply_censo_answer(None, interaction, 1, "1-100", 0, "YES"))
+
+    assert interaction.response.messages == ["⚠️ Ya no formas parte de este censo."]
+    assert g["users"]["0"]["status"] == "REMOVED"